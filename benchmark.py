@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""Benchmarks for Jarvis startup, dataset loading, matching and the server
+
+Usage:
+    python benchmark.py [--sizes 1k,100k,1m] [--output results.json]
+                        [--compare baseline.json --tolerance 0.25]
+
+Each size is a synthetic corpus scaled from the bundled jarvis_data.json
+(prompts gain extra words drawn from the dataset's own vocabulary), so
+results are reproducible for a given --seed. Voice is disabled, the
+response cache and hot reload are off, and webbrowser.open is replaced
+with a no-op, so no audio device or network is needed.
+
+Results are written as JSON. With --compare, the run exits with status 1
+if any benchmark's median time grew by more than --tolerance relative to
+a previous results file, which is how CI catches regressions.
+"""
+import argparse
+import datetime
+import functools
+import http.client
+import http.server
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import webbrowser
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BASE_DATA_FILE = os.path.join(ROOT, "jarvis_data.json")
+
+SIZE_SUFFIXES = {"k": 1000, "m": 1000000}
+
+# Run in a fresh interpreter so module import time is part of cold start
+COLD_START_SCRIPT = """
+import json, logging, sys, time
+started = time.perf_counter()
+import jarvis
+logging.disable(logging.CRITICAL)
+assistant = jarvis.Jarvis(sys.argv[1])
+elapsed = time.perf_counter() - started
+print(json.dumps({"seconds": elapsed, "stages": assistant.startup_timings, "memory": jarvis.memory_usage()}))
+"""
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+def size_label(size):
+    for suffix, factor in sorted(SIZE_SUFFIXES.items(), key=lambda item: -item[1]):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{suffix}"
+    return str(size)
+
+def load_base_conversations():
+    with open(BASE_DATA_FILE, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    base = []
+    for category, value in data.items():
+        if isinstance(value, dict) and "conversations" in value:
+            for conv in value["conversations"]:
+                if conv.get("user") and conv.get("bot"):
+                    base.append((category, conv["user"], conv["bot"]))
+    return base
+
+def generate_corpus(path, size, seed, base):
+    """Write a data file with `size` conversations and benchmark settings"""
+    rng = random.Random(seed)
+    vocabulary = sorted({word for _, user, _ in base for word in user.lower().split()})
+    data = {}
+    for i in range(size):
+        category, user, bot = base[i % len(base)]
+        if i >= len(base):
+            # Later copies get extra words so prompts stay distinct
+            user = f"{user} {rng.choice(vocabulary)} {rng.choice(vocabulary)}"
+        data.setdefault(category, {"categories": [category], "conversations": []})
+        data[category]["conversations"].append({"user": user, "bot": bot})
+
+    directory = os.path.dirname(path)
+    data.update({
+        "data_file": path,
+        "voice_enabled": False,
+        "settings_file": os.path.join(directory, "jarvis_settings.json"),
+        "cache": {"enabled": False},
+        "hot_reload": {"enabled": False},
+    })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+def summarize(name, size, durations):
+    """Timing statistics in seconds for one benchmark"""
+    ordered = sorted(durations)
+    return {
+        "benchmark": name,
+        "size": size,
+        "runs": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "median": statistics.median(ordered),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "min": ordered[0],
+        "max": ordered[-1],
+    }
+
+def time_calls(func, inputs):
+    durations = []
+    for value in inputs:
+        started = time.perf_counter()
+        func(value)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+def bench_cold_start(data_file, repeat):
+    durations = []
+    stages = []
+    memory = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", COLD_START_SCRIPT, data_file],
+            cwd=os.path.dirname(data_file), capture_output=True, text=True, check=True,
+            env=dict(os.environ, PYTHONPATH=ROOT)
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        durations.append(result["seconds"])
+        stages.append(result["stages"])
+        memory.append(result["memory"])
+    return durations, stages, memory
+
+def bench_load_dataset(assistant, repeat):
+    def load(_):
+        # Drop the parse shared with _load_config so every run reads the file
+        assistant._source = None
+        assistant._load_dataset()
+    return time_calls(load, range(repeat))
+
+def make_queries(assistant, rng, count):
+    """Exact hits, near misses for similarity matching, and complete misses"""
+    prompts = sorted(assistant._exact_index)
+    hits = [rng.choice(prompts) for _ in range(count)]
+    near = []
+    for prompt in (rng.choice(prompts) for _ in range(count)):
+        words = prompt.split()
+        if len(words) > 1:
+            del words[rng.randrange(len(words))]
+        near.append(" ".join(words + ["please"]))
+    misses = [" ".join(f"zq{rng.randrange(10 ** 6)}x" for _ in range(3)) for _ in range(count)]
+    return hits, near, misses
+
+class QuietHandler:
+    """Mixin silencing the per-request access log"""
+
+    def log_message(self, format, *args):
+        pass
+
+def bench_server(assistant, queries, clients, requests_per_client):
+    """Requests per second and latencies for /api/query and a static file"""
+    import server
+
+    handler = type("BenchmarkHandler", (QuietHandler, server.MyHTTPRequestHandler), {})
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(handler, directory=ROOT))
+    httpd.daemon_threads = True
+    server.assistant = assistant
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    port = httpd.server_address[1]
+
+    def run(paths):
+        latencies = []
+        lock = threading.Lock()
+
+        def client(offset):
+            local = []
+            for i in range(requests_per_client):
+                path = paths[(offset + i) % len(paths)]
+                started = time.perf_counter()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                connection.request("GET", path, headers={"Accept-Encoding": "gzip"})
+                response = connection.getresponse()
+                response.read()
+                connection.close()
+                local.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local)
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=client, args=(n * requests_per_client,)) for n in range(clients)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return latencies, time.perf_counter() - started
+
+    from urllib.parse import quote
+    try:
+        query_paths = ["/api/query?q=" + quote(query) for query in queries]
+        results = {
+            "server_query": run(query_paths),
+            "server_static": run(["/index.html", "/script.js", "/styles.css"]),
+        }
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        server.assistant = None
+    return results
+
+def run_size(size, args, workdir, base):
+    import jarvis
+
+    label = size_label(size)
+    data_file = os.path.join(workdir, f"corpus_{label}.json")
+    print(f"[{label}] generating corpus", file=sys.stderr)
+    generate_corpus(data_file, size, args.seed, base)
+    results = []
+
+    # Repeats shrink as the corpus grows so the largest size stays practical
+    repeat = args.repeat if size < 1000000 else max(1, args.repeat // 3)
+
+    print(f"[{label}] cold start", file=sys.stderr)
+    for name in ("cold_start", "cold_start_snapshot"):
+        if name == "cold_start_snapshot":
+            jarvis.compile_snapshot(data_file)
+        durations, stages, memory = bench_cold_start(data_file, repeat)
+        entry = summarize(name, size, durations)
+        entry["stages"] = {stage: statistics.median(s[stage] for s in stages if stage in s) for stage in stages[0]}
+        # Resident memory in MB after startup, and the peak while loading
+        entry["memory_mb"] = {key: statistics.median(m[key] for m in memory) for key in memory[0]}
+        results.append(entry)
+    os.remove(jarvis.snapshot_path(data_file))
+
+    assistant = jarvis.Jarvis(data_file)
+    print(f"[{label}] load dataset", file=sys.stderr)
+    results.append(summarize("load_dataset", size, bench_load_dataset(assistant, repeat)))
+
+    rng = random.Random(args.seed)
+    hits, near, misses = make_queries(assistant, rng, args.queries)
+    print(f"[{label}] matching", file=sys.stderr)
+    results.append(summarize("process_command_hit", size, time_calls(assistant.process_command, hits)))
+    results.append(summarize("process_command_miss", size, time_calls(assistant.process_command, misses)))
+    results.append(summarize("find_similar_response", size, time_calls(assistant._find_similar_response, near)))
+    if args.shard_workers:
+        assistant.config["sharding"].update(enabled=True, workers=args.shard_workers, min_conversations=0)
+        assistant._find_similar_response(near[0])
+        results.append(summarize("find_similar_response_sharded", size,
+                                 time_calls(assistant._find_similar_response, near)))
+
+    if not args.skip_server:
+        print(f"[{label}] server", file=sys.stderr)
+        for name, (latencies, elapsed) in bench_server(assistant, hits + near, args.clients, args.requests).items():
+            entry = summarize(name, size, latencies)
+            entry["requests_per_second"] = len(latencies) / elapsed
+            results.append(entry)
+
+    assistant._exit_handler()
+    os.remove(data_file)
+    return results
+
+def compare(results, baseline_file, tolerance):
+    """Return descriptions of benchmarks whose median regressed"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(r["benchmark"], r["size"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["benchmark"], result["size"]))
+        if previous and previous["median"] > 0:
+            change = result["median"] / previous["median"] - 1
+            result["change"] = change
+            if change > tolerance:
+                regressions.append(
+                    f"{result['benchmark']} [{size_label(result['size'])}]: "
+                    f"{previous['median'] * 1000:.3f}ms -> {result['median'] * 1000:.3f}ms ({change:+.0%})"
+                )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1k,100k,1m", help="comma-separated corpus sizes, e.g. 1k,100k,1m")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of the startup and loading benchmarks")
+    parser.add_argument("--queries", type=int, default=500, help="queries per matching benchmark")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent server clients")
+    parser.add_argument("--requests", type=int, default=100, help="requests per server client")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--shard-workers", type=int, default=0,
+                        help="also time sharded matching with this many worker processes")
+    parser.add_argument("--skip-server", action="store_true")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed median slowdown, as a fraction")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import logging
+    import jarvis
+    logging.disable(logging.CRITICAL)
+    # Misses fall back to a Google search in the browser
+    webbrowser.open = lambda *args, **kwargs: True
+
+    base = load_base_conversations()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="jarvis-bench-") as workdir:
+        for size in (parse_size(s) for s in args.sizes.split(",")):
+            results.extend(run_size(size, args, workdir, base))
+
+    report = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+        "similarity_threshold": jarvis.SIMILARITY_THRESHOLD,
+        "results": results,
+    }
+    regressions = compare(results, args.compare, args.tolerance) if args.compare else []
+    report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for regression in regressions:
+        print(f"Regression: {regression}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
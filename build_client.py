@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Compile the knowledge base into a compact index for the web UI
+
+Usage:
+    python build_client.py [jarvis_data.json] [--out dist]
+
+Writes dist/jarvis-index.<hash>.json and dist/manifest.json. The index
+holds a deduplicated response table, a prompt -> responses map for exact
+lookups and the token index used for similarity matching, built by the
+same code as jarvis.py. script.js reads the manifest to find the index,
+answers from it in the browser and only asks /api/query when it finds no
+match. The index file name carries a hash of its content, so server.py
+lets browsers cache it indefinitely; the manifest is revalidated on every
+visit. server.py rebuilds the index at startup when the data file is
+newer, and again after each hot reload. Gzip and, with the brotli
+module, brotli copies of the index are written next to it for server.py
+to send when the index is too large for its memory cache.
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+
+# Optional: brotli copies are written only when the module is installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bump when the index layout changes; script.js ignores other formats
+INDEX_FORMAT = 1
+INDEX_PREFIX = "jarvis-index."
+MANIFEST_NAME = "manifest.json"
+
+def build_index(data_file):
+    """Return the index document for a data file"""
+    from jarvis import SIMILARITY_THRESHOLD, WORD_MATCH_BONUS, build_lookup_tables, load_data_file
+
+    exact_index, conversations, token_index = build_lookup_tables(load_data_file(data_file))
+
+    strings = []
+    string_ids = {}
+    def intern(text):
+        string_id = string_ids.get(text)
+        if string_id is None:
+            string_id = string_ids[text] = len(strings)
+            strings.append(text)
+        return string_id
+
+    prompts = {prompt: [intern(response) for response in responses]
+               for prompt, responses in exact_index.items()}
+    sizes = []
+    responses = []
+    for conv_tokens, response in conversations:
+        sizes.append(len(conv_tokens))
+        responses.append(intern(response))
+
+    # Posting lists are sorted, so gaps are small numbers and short in JSON
+    tokens = {}
+    for token, ids in token_index.items():
+        tokens[token] = [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+
+    return {
+        "format": INDEX_FORMAT,
+        "threshold": SIMILARITY_THRESHOLD,
+        "bonus": WORD_MATCH_BONUS,
+        "strings": strings,
+        "prompts": prompts,
+        "sizes": sizes,
+        "responses": responses,
+        "tokens": tokens,
+    }
+
+def build(data_file="jarvis_data.json", out_dir="dist"):
+    """Write the index and manifest; returns the manifest"""
+    source = os.stat(data_file)
+    content = json.dumps(build_index(data_file), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    name = f"{INDEX_PREFIX}{hashlib.sha256(content).hexdigest()[:16]}.json"
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, name)
+    if not os.path.exists(path):
+        write_atomic(path, content)
+    write_precompressed(path, content)
+    manifest = {
+        "format": INDEX_FORMAT,
+        # Relative to the manifest
+        "index": name,
+        "bytes": len(content),
+        "source_mtime_ns": source.st_mtime_ns,
+        "source_size": source.st_size,
+    }
+    write_atomic(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+
+    # Pages loaded before this build may still ask for the previous index,
+    # so keep it; older ones go
+    previous = sorted(
+        (p for p in glob.glob(os.path.join(out_dir, INDEX_PREFIX + "*.json")) if p != path),
+        key=os.path.getmtime
+    )
+    for stale in previous[:-1]:
+        for stale_path in (stale, stale + ".gz", stale + ".br"):
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+    return manifest
+
+def write_atomic(path, content):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def write_precompressed(path, content):
+    """Write path.gz (and path.br) unless an up-to-date copy exists"""
+    compressors = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append((".br", brotli.compress))
+    for suffix, compress in compressors:
+        compressed_path = path + suffix
+        # server.py ignores copies older than the file itself
+        if not os.path.exists(compressed_path) or os.path.getmtime(compressed_path) < os.path.getmtime(path):
+            write_atomic(compressed_path, compress(content))
+
+def ensure_built(data_file="jarvis_data.json", out_dir="dist"):
+    """Rebuild unless the manifest already describes this data file"""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+        source = os.stat(data_file)
+        if (manifest.get("format") == INDEX_FORMAT
+                and manifest.get("source_mtime_ns") == source.st_mtime_ns
+                and manifest.get("source_size") == source.st_size
+                and os.path.exists(os.path.join(out_dir, manifest["index"]))):
+            return manifest
+    except (OSError, ValueError, KeyError):
+        pass
+    return build(data_file, out_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("data_file", nargs="?", default="jarvis_data.json")
+    parser.add_argument("--out", default="dist", help="output directory, served by server.py")
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    manifest = build(args.data_file, args.out)
+    raw = os.path.getsize(args.data_file)
+    print(f"Wrote {os.path.join(args.out, manifest['index'])}: {manifest['bytes']} bytes ({manifest['bytes'] / raw:.0%} of {args.data_file})")
+
+if __name__ == "__main__":
+    main()
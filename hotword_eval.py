@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Replay WAV fixtures through the offline hotword stage and score it
+
+Usage:
+    python hotword_eval.py POSITIVE_DIR NEGATIVE_DIR [--threshold 1e-40] [--hotword jarvis]
+
+POSITIVE_DIR holds recordings that contain the hotword, NEGATIVE_DIR holds
+speech and background noise that does not. Each file is replayed through
+the same FileAudioSource -> AudioCapture -> HotwordDetector pipeline that
+voice mode uses; a file counts as accepted if any phrase in it fires. The
+report gives false-accept and false-reject rates and the CPU time spent
+per second of audio, as JSON on stdout.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import wave
+
+from jarvis import AudioCapture, FileAudioSource, HotwordDetector, HOTWORD_MIN_SECONDS, HOTWORD_THRESHOLD
+
+def replay(path, detector):
+    """Return (accepted, seconds of audio, phrases decoded) for one file"""
+    source = FileAudioSource(path)
+    capture = AudioCapture(source)
+    capture.start()
+    accepted = False
+    phrases = 0
+    try:
+        while True:
+            pcm = capture.read_phrase(timeout=None, phrase_time_limit=10)
+            if not pcm:
+                break
+            phrases += 1
+            if detector.detect(pcm, capture.sample_rate, capture.sample_width):
+                accepted = True
+    finally:
+        capture.stop()
+
+    with wave.open(path, 'rb') as wav:
+        seconds = wav.getnframes() / wav.getframerate()
+    return accepted, seconds, phrases
+
+def evaluate(files, detector):
+    results = []
+    for path in files:
+        accepted, seconds, phrases = replay(path, detector)
+        results.append({"file": path, "accepted": accepted, "seconds": round(seconds, 3), "phrases": phrases})
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("positive_dir")
+    parser.add_argument("negative_dir")
+    parser.add_argument("--hotword", default="jarvis")
+    parser.add_argument("--threshold", type=float, default=HOTWORD_THRESHOLD)
+    parser.add_argument("--min-seconds", type=float, default=HOTWORD_MIN_SECONDS)
+    parser.add_argument("--verbose", action="store_true", help="include per-file results")
+    args = parser.parse_args()
+
+    positives = sorted(glob.glob(os.path.join(args.positive_dir, "*.wav")))
+    negatives = sorted(glob.glob(os.path.join(args.negative_dir, "*.wav")))
+    if not positives or not negatives:
+        parser.error("both directories must contain .wav files")
+
+    detector = HotwordDetector(args.hotword, threshold=args.threshold, min_seconds=args.min_seconds)
+
+    cpu_started = time.process_time()
+    positive_results = evaluate(positives, detector)
+    negative_results = evaluate(negatives, detector)
+    cpu_seconds = time.process_time() - cpu_started
+
+    negative_seconds = sum(r["seconds"] for r in negative_results)
+    audio_seconds = sum(r["seconds"] for r in positive_results) + negative_seconds
+    false_rejects = sum(not r["accepted"] for r in positive_results)
+    false_accepts = sum(r["accepted"] for r in negative_results)
+    report = {
+        "hotword": args.hotword,
+        "threshold": args.threshold,
+        "positives": len(positive_results),
+        "negatives": len(negative_results),
+        "false_reject_rate": round(false_rejects / len(positive_results), 4),
+        "false_accept_rate": round(false_accepts / len(negative_results), 4),
+        "false_accepts_per_hour": round(false_accepts / (negative_seconds / 3600), 2) if negative_seconds else None,
+        "audio_seconds": round(audio_seconds, 2),
+        "cpu_seconds_per_audio_second": round(cpu_seconds / audio_seconds, 4) if audio_seconds else None,
+    }
+    if args.verbose:
+        report["files"] = positive_results + negative_results
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
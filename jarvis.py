@@ -1,45 +1,1903 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import atexit
+import bisect
 import json
+import marshal
 import random
 import datetime
-import speech_recognition as sr
-import pyttsx3
-from difflib import get_close_matches
+import gc
+import heapq
+import itertools
 import logging
+import logging.handlers
+import math
 import os
+import queue
 import re
 import webbrowser
 import subprocess
 import threading
-from typing import Dict, Any, Optional, List, Callable
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('jarvis.log'),
-        logging.StreamHandler()
-    ]
-)
+import struct
+import sys
+import uuid
+import wave
+from array import array
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Callable, Iterator, Tuple
+
+# The audio stack (speech_recognition, pyttsx3) and the optional vector
+# backend for process_commands (numpy, scipy) are imported on first use so
+# text-only deployments start fast and run without audio drivers
+sr = None
+pyttsx3 = None
+np = None
+sparse = None
+_vector_modules_available: Optional[bool] = None
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# jarvis.log is rotated at this size, keeping this many old files
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+# The request being handled in this context: {"id": ..., "stages": {...}}
+_request_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("jarvis_request", default=None)
+
+# Root handlers and queue listener installed by configure_logging
+_log_handlers: List[logging.Handler] = []
+_log_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per record, with request id and stage timings"""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+                .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "stages", None):
+            entry["stages"] = record.stages
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _RequestFilter(logging.Filter):
+    """Tag records with the id of the request that logged them"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        state = _request_state.get()
+        record.request_id = state["id"] if state else None
+        return True
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread
+    
+    The queue never leaves this process, so records need not be flattened
+    for pickling and a log call costs little more than the enqueue.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(file: str = "jarvis.log", level: str = "INFO", mode: str = "queue",
+                      max_bytes: int = LOG_MAX_BYTES, backup_count: int = LOG_BACKUP_COUNT,
+                      rotate_when: Optional[str] = None, json_lines: bool = False) -> None:
+    """Send log records to a rotating file and stderr
+    
+    In "queue" mode callers only enqueue records and a listener thread
+    formats and writes them; "sync" writes in the calling thread. Files
+    rotate at max_bytes, or on a schedule when rotate_when is set (a
+    TimedRotatingFileHandler interval such as "midnight"). The file is only
+    opened by the first record, so worker processes that import this
+    module but never log leave it alone. Replaces the handlers from any earlier call.
+    """
+    global _log_listener
+    
+    if rotate_when:
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            file, when=rotate_when, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+    else:
+        file_handler = logging.handlers.RotatingFileHandler(
+            file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+    file_handler.setFormatter(JsonLineFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    
+    root = logging.getLogger()
+    for handler in _log_handlers:
+        root.removeHandler(handler)
+    _stop_logging()
+    
+    if mode == "sync":
+        _log_handlers[:] = [file_handler, console_handler]
+    else:
+        records = queue.SimpleQueue()
+        _log_handlers[:] = [_EnqueueHandler(records)]
+        _log_listener = logging.handlers.QueueListener(records, file_handler, console_handler)
+        _log_listener.start()
+    
+    for handler in _log_handlers:
+        # Runs in the logging thread, where the request context is visible
+        handler.addFilter(_RequestFilter())
+        root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+def _stop_logging() -> None:
+    """Flush queued records and close the log handlers"""
+    global _log_listener
+    if _log_listener:
+        _log_listener.stop()
+        for handler in _log_listener.handlers:
+            handler.close()
+        _log_listener = None
+    else:
+        for handler in _log_handlers:
+            handler.close()
+
+
+# Configure logging, unless the embedding application already has
+if not logging.getLogger().handlers:
+    configure_logging()
+    atexit.register(_stop_logging)
 logger = logging.getLogger(__name__)
 
+# Time spent importing this module, reported in the startup timings
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+# Pre-compiled tokenizer shared by indexing and query-time matching
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+# Minimum similarity score for a dataset response to be used (adjust as needed)
+SIMILARITY_THRESHOLD = 0.3
+# Score added per query word found in a stored prompt
+WORD_MATCH_BONUS = 0.1
+# Number of queries scored per sparse matrix product in process_commands
+BATCH_CHUNK_SIZE = 1024
+# Typo correction: unknown query words shorter than this are left alone,
+# and words shorter than TYPO_LONG_TOKEN may only be one edit off
+TYPO_MIN_TOKEN = 3
+TYPO_LONG_TOKEN = 6
+
+# Candidate responses for an input and the score that selected them
+CandidateMatch = Tuple[List[str], float]
+
+# Histogram bucket upper bounds for stage latencies (seconds) and match scores
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0)
+SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 1.5, 2.0)
+METRIC_HELP = {
+    "jarvis_requests_total": "Inputs matched against the dataset",
+    "jarvis_cache_hits_total": "Lookups answered from the response cache",
+    "jarvis_cache_misses_total": "Lookups that had to search the dataset",
+    "jarvis_web_search_fallbacks_total": "Inputs answered by opening a web search",
+    "jarvis_match_score": "Score of the best dataset match per input",
+    "jarvis_stage_seconds": "Time spent in each processing stage",
+}
+
+# Maximum number of utterances waiting for the TTS worker
+SPEECH_QUEUE_SIZE = 16
+
+# Audio capture: frames per chunk, seconds of audio used for the initial
+# calibration and kept before speech starts, and silence ending a phrase
+AUDIO_CHUNK_FRAMES = 1024
+CALIBRATION_SECONDS = 1.0
+PRE_ROLL_SECONDS = 0.3
+PAUSE_THRESHOLD = 0.8
+# Speech must be this much louder than the ambient level, and never below
+# the floor (keeps digital silence from reading as speech)
+ENERGY_RATIO = 1.5
+MIN_ENERGY_THRESHOLD = 100.0
+# Weight of the previous ambient level when tracking background noise
+AMBIENT_DECAY = 0.95
+# Give up on a source that delivers no audio for this many seconds
+AUDIO_STALL_SECONDS = 2.0
+
+# Offline hotword spotting: pocketsphinx keyword threshold (smaller values
+# accept more) and the shortest phrase worth decoding
+HOTWORD_THRESHOLD = 1e-40
+HOTWORD_MIN_SECONDS = 0.25
+# Sample rate of pocketsphinx's bundled acoustic model
+SPHINX_SAMPLE_RATE = 16000
+# Seconds of audio per word revealed by ReplayRecognizer's partial results
+REPLAY_WORD_SECONDS = 0.3
+
+# Runtime settings changed by commands and persisted to the settings file
+PERSISTED_SETTINGS = ("language", "voice_enabled", "voice_rate", "voice_volume")
+# Seconds to wait for further changes before writing settings
+SETTINGS_SAVE_DELAY = 0.5
+
+# Characters read from the data file at a time by the streaming loader
+JSON_CHUNK_SIZE = 1 << 20
+
+# Sharded matching: smallest corpus worth spreading over worker processes
+SHARDING_MIN_CONVERSATIONS = 100000
+
+# Compiled knowledge-base snapshot format (see compile_snapshot)
+SNAPSHOT_MAGIC = b"JARVISKB"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<8sHBB")
+
+
+def load_speech_modules() -> None:
+    """Import speech_recognition and pyttsx3 on first use"""
+    global sr, pyttsx3
+    if sr is None:
+        import speech_recognition as sr
+    if pyttsx3 is None:
+        import pyttsx3
+
+
+def load_vector_modules() -> bool:
+    """Import numpy and scipy on first use; False if they are not installed"""
+    global np, sparse, _vector_modules_available
+    if _vector_modules_available is None:
+        try:
+            import numpy as np
+            from scipy import sparse
+            _vector_modules_available = True
+        except ImportError:
+            _vector_modules_available = False
+    return _vector_modules_available
+
+
+def pcm_rms(chunk: bytes) -> float:
+    """Root-mean-square energy of 16-bit little-endian mono PCM"""
+    samples = array('h')
+    samples.frombytes(chunk[:len(chunk) - len(chunk) % 2])
+    if not samples:
+        return 0.0
+    if sys.byteorder == 'big':
+        samples.byteswap()
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples))
+
+
+def resample_pcm(pcm: bytes, sample_rate: int, sample_width: int,
+                 target_rate: int = SPHINX_SAMPLE_RATE) -> bytes:
+    """Convert mono PCM to 16-bit samples at target_rate"""
+    if sample_rate == target_rate and sample_width == 2:
+        return pcm
+    load_speech_modules()
+    return sr.AudioData(pcm, sample_rate, sample_width).get_raw_data(
+        convert_rate=target_rate, convert_width=2
+    )
+
+
+def tokenize(text: str) -> List[str]:
+    """Split lower-cased text into word tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def load_data_file(path: str) -> Dict[str, Any]:
+    """Parse a data file incrementally into compact category records
+    
+    Conversations are decoded one at a time instead of materializing the
+    whole JSON tree, and each category becomes a CategoryRecord. Identical
+    prompt and response strings anywhere in the file share one object.
+    Other top-level values (configuration) are returned as parsed.
+    """
+    strings: Dict[str, str] = {}
+    data: Dict[str, Any] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        stream = JsonStream(f)
+        for name in stream.members():
+            if stream.peek() != "{":
+                data[name] = stream.value()
+                continue
+            
+            fields: Dict[str, Any] = {}
+            users: Optional[List[str]] = None
+            bots: List[str] = []
+            for field in stream.members():
+                if field != "conversations" or stream.peek() != "[":
+                    fields[field] = stream.value()
+                    continue
+                users = []
+                for _ in stream.elements():
+                    conv = stream.value()
+                    if not isinstance(conv, dict):
+                        continue
+                    user, bot = conv.get("user", ""), conv.get("bot", "")
+                    users.append(strings.setdefault(user, user) if isinstance(user, str) else "")
+                    bots.append(strings.setdefault(bot, bot) if isinstance(bot, str) else "")
+            
+            if users is None:
+                data[name] = fields
+            else:
+                data[name] = CategoryRecord(fields.get("categories", []), users, bots)
+        stream.end()
+    return data
+
+
+def memory_usage() -> Dict[str, float]:
+    """Current and peak resident memory of this process in MB, where known"""
+    usage = {}
+    try:
+        with open("/proc/self/statm") as f:
+            usage["rss"] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in bytes on macOS and in kilobytes elsewhere
+        usage["peak_rss"] = peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+    except ImportError:
+        pass
+    return usage
+
+
+def build_lookup_tables(dataset: Dict[str, Any]) -> Tuple[Dict[str, List[str]], List[tuple], Dict[str, List[int]]]:
+    """Build exact-match and token lookup structures over a dataset
+    
+    Returns (exact_index, conversations, token_index) where exact_index maps
+    a normalized prompt to every bot response recorded for it, conversations
+    holds (distinct prompt tokens, bot response) entries and token_index
+    maps a token to the ids of conversations containing it.
+    """
+    exact_index: Dict[str, List[str]] = {}
+    conversations: List[tuple] = []
+    token_index: Dict[str, List[int]] = {}
+    tables = (exact_index, conversations, token_index)
+    
+    for category_data in dataset.values():
+        if isinstance(category_data, CategoryRecord):
+            for user_text, response_text in category_data.conversations():
+                add_conversation(tables, user_text, response_text)
+    
+    return tables
+
+
+def prompt_tokens(user_text: str) -> Tuple[str, ...]:
+    """Distinct tokens of a prompt in order, interned to share storage"""
+    return tuple(dict.fromkeys(map(sys.intern, tokenize(user_text))))
+
+
+def add_conversation(tables: tuple, user_text: str, response_text: str) -> None:
+    """Add one conversation to the lookup tables from build_lookup_tables"""
+    exact_index, conversations, token_index = tables
+    if not user_text or not response_text:
+        return
+    
+    prompt = user_text.lower().strip()
+    exact_index.setdefault(prompt, []).append(response_text)
+    
+    conv_tokens = prompt_tokens(user_text)
+    if not conv_tokens:
+        return
+    
+    # New ids are always the largest, so posting lists stay sorted
+    conv_id = len(conversations)
+    conversations.append((conv_tokens, response_text))
+    for token in conv_tokens:
+        token_index.setdefault(token, []).append(conv_id)
+
+
+def remove_conversation(tables: tuple, user_text: str, response_text: str) -> bool:
+    """Remove one conversation from the lookup tables
+    
+    The conversation slot is left as a None tombstone so the ids of other
+    conversations stay valid. Returns True if a tombstone was created.
+    """
+    exact_index, conversations, token_index = tables
+    if not user_text or not response_text:
+        return False
+    
+    prompt = user_text.lower().strip()
+    responses = exact_index.get(prompt)
+    if responses and response_text in responses:
+        responses.remove(response_text)
+        if not responses:
+            del exact_index[prompt]
+    
+    conv_tokens = prompt_tokens(user_text)
+    if not conv_tokens:
+        return False
+    
+    # Any posting list of the prompt's tokens contains the conversation
+    postings = min((token_index.get(token, []) for token in conv_tokens), key=len)
+    for conv_id in postings:
+        entry = conversations[conv_id]
+        if entry[1] == response_text and entry[0] == conv_tokens:
+            break
+    else:
+        return False
+    
+    conversations[conv_id] = None
+    for token in conv_tokens:
+        ids = token_index[token]
+        ids.remove(conv_id)
+        if not ids:
+            del token_index[token]
+    return True
+
+
+def diff_conversations(old: Dict[str, Any], new: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """Return the (user, bot) pairs removed from and added to a dataset"""
+    def category_pairs(dataset: Dict[str, Any], name: str) -> Counter:
+        category_data = dataset.get(name)
+        if not isinstance(category_data, CategoryRecord):
+            return Counter()
+        return Counter(category_data.conversations())
+    
+    removed: List[Tuple[str, str]] = []
+    added: List[Tuple[str, str]] = []
+    for name in old.keys() | new.keys():
+        # Unchanged categories are skipped without looking at conversations
+        if old.get(name) == new.get(name):
+            continue
+        old_pairs = category_pairs(old, name)
+        new_pairs = category_pairs(new, name)
+        removed.extend((old_pairs - new_pairs).elements())
+        added.extend((new_pairs - old_pairs).elements())
+    
+    return removed, added
+
+
+def file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it cannot be read"""
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein (optimal string alignment) distance, capped
+    
+    Returns limit + 1 as soon as the distance is known to exceed limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: Optional[List[int]] = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, char_b in enumerate(b, 1):
+            cost = char_a != char_b
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and j > 1 and char_a == b[j - 2]
+                    and a[i - 2] == char_b):
+                # Transposition of two adjacent characters
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def snapshot_path(data_file: str) -> str:
+    """Return the compiled snapshot path for a JSON data file"""
+    return os.path.splitext(data_file)[0] + ".kb"
+
+
+def compile_snapshot(data_file: str = "jarvis_data.json", output: Optional[str] = None) -> str:
+    """Compile a JSON data file and its lookup tables into a binary snapshot
+    
+    The snapshot is written with marshal, which deserializes far faster than
+    json.load plus index building, so it is tied to the Python version that
+    wrote it. It is written atomically and records the source size and
+    mtime so stale snapshots are ignored.
+    """
+    output = output or snapshot_path(data_file)
+    source_stat = os.stat(data_file)
+    dataset = load_data_file(data_file)
+    
+    exact_index, conversations, token_index = build_lookup_tables(dataset)
+    payload = marshal.dumps({
+        "source_mtime_ns": source_stat.st_mtime_ns,
+        "source_size": source_stat.st_size,
+        # marshal only stores built-in types; JSON never yields tuples, so a
+        # tuple unambiguously marks a category record
+        "dataset": {
+            name: (value.categories, value.users, value.bots) if isinstance(value, CategoryRecord) else value
+            for name, value in dataset.items()
+        },
+        "exact_index": exact_index,
+        "conversations": conversations,
+        "token_index": token_index,
+    })
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sys.version_info.major, sys.version_info.minor
+    )
+    
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, output)
+    return output
+
+
+def load_snapshot(data_file: str) -> Optional[Dict[str, Any]]:
+    """Load the snapshot for data_file if it is compatible and up to date"""
+    path = snapshot_path(data_file)
+    try:
+        source_stat = os.stat(data_file)
+        if os.stat(path).st_mtime_ns < source_stat.st_mtime_ns:
+            return None
+        
+        with open(path, 'rb') as f:
+            raw = f.read()
+        
+        magic, version, major, minor = SNAPSHOT_HEADER.unpack_from(raw)
+        if (magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION
+                or (major, minor) != sys.version_info[:2]):
+            logger.info(f"Ignoring incompatible snapshot {path}")
+            return None
+        
+        # The snapshot is one large acyclic object graph; cyclic GC passes
+        # triggered while it is being built are pure overhead
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            snapshot = marshal.loads(raw[SNAPSHOT_HEADER.size:])
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        if (snapshot.get("source_mtime_ns") != source_stat.st_mtime_ns
+                or snapshot.get("source_size") != source_stat.st_size):
+            logger.info(f"Ignoring stale snapshot {path}")
+            return None
+        
+        snapshot["dataset"] = {
+            name: CategoryRecord(*value) if isinstance(value, tuple) else value
+            for name, value in snapshot["dataset"].items()
+        }
+        return snapshot
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading snapshot {path}: {e}")
+        return None
+
+
+# Shared token data attached by this process when it is a ShardedMatcher
+# worker: shared memory name -> (SharedMemory, postings, sizes)
+_shard_data: Dict[str, tuple] = {}
+
+
+def _attach_shard_data(name: str, posting_count: int, conversation_count: int) -> tuple:
+    """Map the matcher's shared arrays, dropping any older generation"""
+    data = _shard_data.get(name)
+    if data is None:
+        from multiprocessing import shared_memory
+        import numpy
+        
+        for old_name in list(_shard_data):
+            _shard_data.pop(old_name)[0].close()
+        shm = shared_memory.SharedMemory(name=name)
+        postings = numpy.ndarray((posting_count,), dtype=numpy.int32, buffer=shm.buf)
+        sizes = numpy.ndarray((conversation_count,), dtype=numpy.int32, buffer=shm.buf,
+                              offset=posting_count * 4)
+        data = _shard_data[name] = (shm, postings, sizes)
+    return data
+
+
+def _score_shard(name: str, posting_count: int, conversation_count: int,
+                 lo: int, hi: int, slices: List[Tuple[int, int, int]],
+                 input_size: int) -> Tuple[float, int]:
+    """Best (score, conversation id) among conversations lo..hi-1
+    
+    slices holds (start, end, occurrences) of each query token's posting
+    list. Scores are computed exactly as Jarvis._best_match does, and ties
+    go to the lowest id. Returns (0.0, -1) if nothing shares a token.
+    """
+    import numpy
+    
+    _, postings, sizes = _attach_shard_data(name, posting_count, conversation_count)
+    intersection = numpy.zeros(hi - lo, dtype=numpy.int64)
+    bonus = numpy.zeros(hi - lo, dtype=numpy.float64)
+    for start, end, occurrences in slices:
+        posting = postings[start:end]
+        first, last = numpy.searchsorted(posting, (lo, hi))
+        ids = posting[first:last] - lo
+        # Ids are unique within a posting list, so fancy increments are safe
+        intersection[ids] += 1
+        bonus[ids] += occurrences
+    
+    candidates = numpy.flatnonzero(intersection)
+    if not candidates.size:
+        return 0.0, -1
+    shared = intersection[candidates]
+    scores = shared / (input_size + sizes[lo + candidates] - shared) + bonus[candidates] * WORD_MATCH_BONUS
+    best = int(numpy.argmax(scores))
+    return float(scores[best]), lo + int(candidates[best])
+
+
+class CategoryRecord:
+    """One dataset category, its conversations as parallel string tables
+    
+    users[i] and bots[i] form conversation i. The loader shares identical
+    strings, so a prompt repeated for several answers is stored once.
+    """
+    
+    __slots__ = ("categories", "users", "bots")
+    
+    def __init__(self, categories: List[Any], users: List[str], bots: List[str]):
+        self.categories = categories
+        self.users = users
+        self.bots = bots
+    
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, CategoryRecord):
+            return NotImplemented
+        return (self.users == other.users and self.bots == other.bots
+                and self.categories == other.categories)
+    
+    __hash__ = None
+    
+    def __len__(self) -> int:
+        return len(self.users)
+    
+    def conversations(self) -> Iterator[Tuple[str, str]]:
+        """Iterate (user, bot) pairs in file order"""
+        return zip(self.users, self.bots)
+
+
+class JsonStream:
+    """Reads one JSON document from a text file a value at a time
+    
+    members() and elements() walk objects and arrays without decoding them
+    whole; value() decodes the next complete value. Only the unread part of
+    the current chunk is buffered.
+    """
+    
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+    _DELIMITERS = frozenset(',:]} \t\n\r')
+    
+    def __init__(self, f: Any, chunk_size: int = JSON_CHUNK_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+    
+    def peek(self) -> str:
+        """Return the next non-whitespace character, or "" at the end"""
+        while True:
+            self._pos = self._WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(self._chunk_size):
+                return ""
+    
+    def value(self) -> Any:
+        """Decode the next complete value"""
+        self.peek()
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number cut off by the end of the chunk decodes early
+                # ("2." as 2), so only trust a value followed by a delimiter
+                if self._eof or self._buffer[end:end + 1] in self._DELIMITERS:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Read ever larger chunks so a huge value is not re-parsed often
+            self._fill(size)
+            size *= 2
+    
+    def members(self) -> Iterator[str]:
+        """Yield each key of the next object; the caller reads its value"""
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                self._fail("Expecting property name")
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+    
+    def elements(self) -> Iterator[None]:
+        """Yield once per element of the next array; the caller reads it"""
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            if self._expect(",]") == "]":
+                return
+    
+    def end(self) -> None:
+        """Check that nothing but whitespace follows the document"""
+        if self.peek():
+            self._fail("Extra data")
+    
+    def _expect(self, choices: str) -> str:
+        char = self.peek()
+        if not char or char not in choices:
+            self._fail(f"Expecting {' or '.join(repr(c) for c in choices)}")
+        self._pos += 1
+        return char
+    
+    def _fail(self, message: str) -> None:
+        raise json.JSONDecodeError(message, self._buffer, self._pos)
+    
+    def _fill(self, size: int) -> bool:
+        """Append the next chunk, dropping consumed text; False at the end"""
+        data = self._file.read(size)
+        if not data:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+
+class TypoIndex:
+    """Finds indexed words within a small edit distance of a misspelling
+    
+    A symmetric deletion index: every word is filed under itself and each
+    string made by deleting one of its characters. A query word looks up
+    the same variants of itself, which finds words one substitution,
+    insertion, deletion or transposition away (and many two away) without
+    scanning the vocabulary. Candidates are then checked with edit_distance.
+    """
+    
+    __slots__ = ("_frequencies", "_variants")
+    
+    def __init__(self, frequencies: Dict[str, int]):
+        self._frequencies = frequencies
+        # Most variants belong to one word, stored bare instead of in a list
+        self._variants: Dict[str, Any] = {}
+        for word in frequencies:
+            for variant in self._deletions(word):
+                words = self._variants.get(variant)
+                if words is None:
+                    self._variants[variant] = word
+                elif isinstance(words, str):
+                    self._variants[variant] = [words, word]
+                else:
+                    words.append(word)
+    
+    @staticmethod
+    def _deletions(word: str) -> set:
+        variants = {word[:i] + word[i + 1:] for i in range(len(word))}
+        variants.add(word)
+        return variants
+    
+    def correct(self, word: str, max_distance: int) -> Optional[str]:
+        """Closest indexed word within max_distance, the most frequent on a tie"""
+        best = None
+        best_key = (max_distance + 1, 0)
+        seen = set()
+        for variant in self._deletions(word):
+            words = self._variants.get(variant, ())
+            for candidate in (words,) if isinstance(words, str) else words:
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self._frequencies[candidate])
+                if key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+
+class DatasetPartition:
+    """One language's knowledge base and lookup tables, parked while inactive"""
+    
+    __slots__ = ("data_file", "signature", "dataset", "tables", "tombstones")
+    
+    def __init__(self, data_file: str, signature: Optional[Tuple[int, int]],
+                 dataset: Dict[str, Any], tables: tuple, tombstones: int = 0):
+        self.data_file = data_file
+        self.signature = signature
+        self.dataset = dataset
+        self.tables = tables
+        self.tombstones = tombstones
+    
+    @property
+    def size(self) -> int:
+        """Size of the source file, the yardstick for the memory budget"""
+        return self.signature[1] if self.signature else 0
+
+
+class ReadWriteLock:
+    """Lock allowing many concurrent readers or a single writer
+    
+    Waiting writers block new readers so a reload is never starved by a
+    steady stream of queries. Not reentrant.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+    
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+    
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of response candidates with optional TTL"""
+    
+    def __init__(self, max_size: int = 1024, ttl: float = 0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, CandidateMatch]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[CandidateMatch]:
+        """Return cached candidates for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, candidates = entry
+                if not self.ttl or time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return candidates
+                del self._entries[key]
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, candidates: CandidateMatch) -> None:
+        """Store candidates for key, evicting the least recently used entry"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), candidates)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current occupancy"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+class ShardedMatcher:
+    """Similarity scoring spread over a pool of worker processes
+    
+    Posting lists and prompt sizes are packed into one shared-memory block
+    that every worker maps, so the corpus is never copied per process. The
+    corpus is split into contiguous id ranges (following dataset order, and
+    so roughly by category), each worker scores one range and the best
+    results are merged. Requires numpy.
+    """
+    
+    def __init__(self, workers: int = 0):
+        import multiprocessing
+        
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        # Spawned rather than forked: the parent has running threads, and
+        # spawn is the only start method on Windows
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        self._shm = None
+        self._postings: Dict[str, Tuple[int, int]] = {}
+        self._shards: List[Tuple[int, int]] = []
+        self._posting_count = 0
+        self._conversation_count = 0
+    
+    def load(self, conversations: List[tuple], token_index: Dict[str, List[int]]) -> None:
+        """Publish the lookup tables to the workers, replacing older ones
+        
+        Must not run concurrently with best_match.
+        """
+        from multiprocessing import shared_memory
+        
+        posting_count = sum(len(ids) for ids in token_index.values())
+        conversation_count = len(conversations)
+        shm = shared_memory.SharedMemory(create=True, size=max(4, (posting_count + conversation_count) * 4))
+        postings = np.ndarray((posting_count,), dtype=np.int32, buffer=shm.buf)
+        sizes = np.ndarray((conversation_count,), dtype=np.int32, buffer=shm.buf, offset=posting_count * 4)
+        
+        offsets = {}
+        position = 0
+        for token, ids in token_index.items():
+            postings[position:position + len(ids)] = ids
+            offsets[token] = (position, position + len(ids))
+            position += len(ids)
+        sizes[:] = [len(entry[0]) if entry else 0 for entry in conversations]
+        del postings, sizes
+        
+        step = -(-conversation_count // self.workers) or 1
+        old_shm, self._shm = self._shm, shm
+        self._postings = offsets
+        self._shards = [(lo, min(lo + step, conversation_count)) for lo in range(0, conversation_count, step)]
+        self._posting_count = posting_count
+        self._conversation_count = conversation_count
+        # Workers attach the new block on their next task; result() raises
+        # if a worker could not, so a broken pool fails here rather than
+        # on the first query
+        try:
+            for future in [self._submit(lo, hi, [], 1) for lo, hi in self._shards]:
+                future.result()
+        finally:
+            if old_shm:
+                old_shm.close()
+                old_shm.unlink()
+    
+    def best_match(self, input_tokens: List[str]) -> Tuple[float, int]:
+        """Return (score, conversation id) of the best match, or (0.0, -1)"""
+        occurrences = Counter(input_tokens)
+        slices = [
+            self._postings[token] + (count,)
+            for token, count in occurrences.items() if token in self._postings
+        ]
+        if not slices:
+            return 0.0, -1
+        
+        futures = [self._submit(lo, hi, slices, len(occurrences)) for lo, hi in self._shards]
+        # Shards are in id order, so keeping the first best score resolves
+        # ties as a corpus-order scan would
+        best_score, best_id = 0.0, -1
+        for future in futures:
+            score, conv_id = future.result()
+            if score > best_score:
+                best_score, best_id = score, conv_id
+        return best_score, best_id
+    
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._shm:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+    
+    def _submit(self, lo: int, hi: int, slices: list, input_size: int) -> Future:
+        return self._pool.submit(
+            _score_shard, self._shm.name, self._posting_count, self._conversation_count,
+            lo, hi, slices, input_size
+        )
+
+
+class Metrics:
+    """Counters and histograms for request stages, rendered for Prometheus
+    
+    An observation costs one lock acquisition and a bisect, cheap enough to
+    leave on in production. A disabled instance ignores every call except
+    stage timings, which still reach the request log line and, at debug
+    level, the log.
+    """
+    
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        # Keyed by (metric name, sorted label pairs)
+        self._counters: Dict[tuple, float] = {}
+        # Values are [bucket counts..., sum, count]
+        self._histograms: Dict[tuple, list] = {}
+        self._buckets: Dict[str, tuple] = {}
+        for name in ("jarvis_requests_total", "jarvis_cache_hits_total",
+                     "jarvis_cache_misses_total", "jarvis_web_search_fallbacks_total"):
+            self._counters[(name, ())] = 0.0
+    
+    def inc(self, name: str, value: float = 1.0, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+    
+    def observe(self, name: str, value: float, buckets: tuple = LATENCY_BUCKETS, **labels: str) -> None:
+        if not self.enabled:
+            return
+        self._observe((name, tuple(sorted(labels.items())) if labels else ()), value, buckets)
+    
+    def observe_stage(self, stage: str, seconds: float) -> None:
+        """Record the duration of a stage in jarvis_stage_seconds"""
+        state = _request_state.get()
+        if state is not None:
+            # Per-request breakdown for the request log line
+            state["stages"][stage] = state["stages"].get(stage, 0.0) + seconds
+        if not self.enabled:
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Stage {stage} took {seconds * 1000:.1f}ms")
+            return
+        self._observe(("jarvis_stage_seconds", (("stage", stage),)), seconds, LATENCY_BUCKETS)
+    
+    def time(self, stage: str):
+        """Context manager recording the duration of a stage"""
+        if self.enabled or _request_state.get() is not None or logger.isEnabledFor(logging.DEBUG):
+            return _StageTimer(self, stage)
+        return nullcontext()
+    
+    def _observe(self, key: tuple, value: float, buckets: tuple) -> None:
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                self._buckets[key[0]] = buckets
+                histogram = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+            histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+    
+    def summary(self) -> str:
+        """One-line digest of the counters and mean stage latencies"""
+        with self._lock:
+            counters = {name: value for (name, labels), value in self._counters.items() if not labels}
+            stages = {
+                dict(labels)["stage"]: (histogram[-1], histogram[-2])
+                for (name, labels), histogram in self._histograms.items()
+                if name == "jarvis_stage_seconds"
+            }
+        parts = [f"{name[len('jarvis_'):-len('_total')]}={value:g}" for name, value in sorted(counters.items())]
+        parts += [
+            f"{stage}={count}x{total / count * 1000:.2f}ms"
+            for stage, (count, total) in sorted(stages.items()) if count
+        ]
+        return ", ".join(parts)
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+        
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(value)) for key, value in self._histograms.items())
+        
+        lines = []
+        described = set()
+        
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+        
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{name}{label_text(labels)} {value:g}")
+        
+        for (name, labels), histogram in histograms:
+            describe(name, "histogram")
+            cumulative = 0
+            for bound, count in zip(self._buckets[name] + (float("inf"),), histogram[:-2]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{label_text(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{label_text(labels)} {histogram[-2]:.6g}")
+            lines.append(f"{name}_count{label_text(labels)} {histogram[-1]}")
+        
+        return "\n".join(lines) + "\n"
+
+
+class _StageTimer:
+    """Records elapsed time into jarvis_stage_seconds on exit"""
+    
+    __slots__ = ("metrics", "stage", "started")
+    
+    def __init__(self, metrics: Metrics, stage: str):
+        self.metrics = metrics
+        self.stage = stage
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.metrics.observe_stage(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class SpeechQueue:
+    """Single TTS worker that owns the engine and speaks queued utterances
+    
+    Lower priority numbers are spoken first (1 is highest). A new utterance
+    cancels queued speech of lower priority and interrupts it if it is
+    playing; text already waiting at the same or higher priority is
+    coalesced into the existing utterance. Each utterance is tracked by a
+    Future resolving to True when spoken and False when interrupted.
+    
+    pyttsx3 engines are not thread-safe, so only the worker touches the
+    engine: an interrupt sets a flag that the worker checks as each word
+    starts, and it stops the engine from its own thread.
+    """
+    
+    def __init__(self, engine_factory: Callable[[], Any], max_size: int = SPEECH_QUEUE_SIZE,
+                 metrics: Optional[Metrics] = None):
+        self.engine = None
+        self.max_size = max_size
+        self.metrics = metrics or Metrics(enabled=False)
+        self._engine_factory = engine_factory
+        # Entries are (priority, sequence, text, future)
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._current: Optional[int] = None
+        self._interrupted = False
+        self._closed = False
+        self._ready = threading.Event()
+        self._error: Optional[Exception] = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> Any:
+        """Start the worker and return the engine it created"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+        return self.engine
+    
+    def submit(self, text: str, priority: int = 1) -> Future:
+        """Queue text for speech without waiting for playback"""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                future.cancel()
+                return future
+            
+            for entry in self._heap:
+                if entry[2] == text and entry[0] <= priority:
+                    return entry[3]
+            
+            # Barge-in: newer, more important speech makes the rest stale
+            stale = [entry for entry in self._heap if entry[0] > priority]
+            if stale:
+                for entry in stale:
+                    entry[3].cancel()
+                self._heap = [entry for entry in self._heap if entry[0] <= priority]
+                heapq.heapify(self._heap)
+            if self._current is not None and self._current > priority:
+                self._interrupt()
+            
+            if len(self._heap) >= self.max_size:
+                # Make room by dropping the oldest least important utterance
+                victim = max(self._heap, key=lambda entry: (entry[0], -entry[1]))
+                if victim[0] < priority:
+                    future.cancel()
+                    return future
+                self._heap.remove(victim)
+                heapq.heapify(self._heap)
+                victim[3].cancel()
+            
+            heapq.heappush(self._heap, (priority, next(self._sequence), text, future))
+            self._cond.notify()
+        return future
+    
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None) -> None:
+        """Stop accepting speech; with wait, finish what is already queued"""
+        with self._cond:
+            self._closed = True
+            if not wait:
+                for entry in self._heap:
+                    entry[3].cancel()
+                self._heap = []
+                if self._current is not None:
+                    self._interrupt()
+            self._cond.notify()
+        if wait and self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+    
+    def _interrupt(self) -> None:
+        """Have the worker stop the utterance being spoken at the next word;
+        the caller holds the condition
+        """
+        self._interrupted = True
+    
+    def _on_word(self, name: Optional[str], location: int, length: int) -> None:
+        """started-word callback, run by the engine on the worker thread"""
+        if self._interrupted:
+            try:
+                self.engine.stop()
+            except Exception as e:
+                logger.debug(f"Could not interrupt speech: {e}")
+    
+    def _run(self) -> None:
+        try:
+            self.engine = self._engine_factory()
+            self.engine.connect('started-word', self._on_word)
+        except Exception as e:
+            self._error = e
+            return
+        finally:
+            self._ready.set()
+        
+        while True:
+            with self._cond:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                priority, _, text, future = heapq.heappop(self._heap)
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._current = priority
+                self._interrupted = False
+            
+            try:
+                with self.metrics.time("tts"):
+                    self.engine.say(text)
+                    self.engine.runAndWait()
+                with self._cond:
+                    spoken = not self._interrupted
+                future.set_result(spoken)
+            except Exception as e:
+                logger.error(f"Speech synthesis error: {e}")
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._current = None
+
+
+class MicrophoneSource:
+    """Audio source that keeps one microphone stream open"""
+    
+    live = True
+    
+    def __init__(self, chunk_frames: int = AUDIO_CHUNK_FRAMES):
+        load_speech_modules()
+        self._microphone = sr.Microphone(chunk_size=chunk_frames)
+        self._microphone.__enter__()
+        self.sample_rate = self._microphone.SAMPLE_RATE
+        self.sample_width = self._microphone.SAMPLE_WIDTH
+        self.chunk_frames = self._microphone.CHUNK
+    
+    def read(self) -> bytes:
+        return self._microphone.stream.read(self.chunk_frames)
+    
+    def close(self) -> None:
+        self._microphone.__exit__(None, None, None)
+
+
+class FileAudioSource:
+    """Audio source replaying a WAV or raw PCM file in place of a microphone
+    
+    Audio must be 16-bit; only the first channel of a multi-channel WAV is
+    used. Raw files are headerless mono PCM at sample_rate. With realtime
+    the file is paced like a live device, otherwise it is read as fast as
+    the consumer keeps up.
+    """
+    
+    live = False
+    
+    def __init__(self, path: str, sample_rate: int = 16000,
+                 chunk_frames: int = AUDIO_CHUNK_FRAMES, realtime: bool = False):
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.realtime = realtime
+        self.sample_width = 2
+        self._wav = None
+        self._raw = None
+        
+        if path.lower().endswith('.wav'):
+            self._wav = wave.open(path, 'rb')
+            if self._wav.getsampwidth() != 2:
+                self._wav.close()
+                raise ValueError(f"{path}: only 16-bit WAV audio is supported")
+            self.channels = self._wav.getnchannels()
+            self.sample_rate = self._wav.getframerate()
+        else:
+            self._raw = open(path, 'rb')
+            self.channels = 1
+            self.sample_rate = sample_rate
+    
+    def read(self) -> bytes:
+        if self._wav:
+            data = self._wav.readframes(self.chunk_frames)
+            if self.channels > 1:
+                data = array('h', data)[::self.channels].tobytes()
+        else:
+            data = self._raw.read(self.chunk_frames * self.sample_width)
+        
+        if self.realtime and data:
+            time.sleep(len(data) / self.sample_width / self.sample_rate)
+        return data
+    
+    def close(self) -> None:
+        if self._wav:
+            self._wav.close()
+        if self._raw:
+            self._raw.close()
+
+
+class AudioCapture:
+    """Continuous capture from an audio source into a ring buffer
+    
+    A background thread reads the source and tags each chunk with its
+    energy. The speech threshold is calibrated from the first second of
+    audio and then follows the ambient level of every non-speech chunk, so
+    callers never pause to recalibrate. Live sources drop the oldest audio
+    when the buffer is full; file sources wait for the reader instead.
+    """
+    
+    def __init__(self, source: Any, buffer_seconds: float = 10.0,
+                 pause_threshold: float = PAUSE_THRESHOLD):
+        self.source = source
+        self.sample_rate = source.sample_rate
+        self.sample_width = source.sample_width
+        self.chunk_seconds = source.chunk_frames / source.sample_rate
+        self.pause_threshold = pause_threshold
+        self.energy_threshold = MIN_ENERGY_THRESHOLD
+        self.exhausted = False
+        self._capacity = max(1, int(buffer_seconds / self.chunk_seconds))
+        # Entries are (sequence number, PCM chunk, RMS energy)
+        self._chunks: deque = deque()
+        self._next_seq = 0
+        self._read_seq = 0
+        self._ambient: Optional[float] = None
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1)
+        try:
+            self.source.close()
+        except Exception as e:
+            logger.debug(f"Error closing audio source: {e}")
+    
+    def flush(self) -> None:
+        """Discard buffered audio, e.g. our own speech output"""
+        with self._cond:
+            self._read_seq = self._next_seq
+            self._cond.notify_all()
+    
+    def read_phrase(self, timeout: Optional[float] = None,
+                    phrase_time_limit: Optional[float] = None) -> Optional[bytes]:
+        """Return the PCM of the next phrase, or None if none starts in time
+        
+        Timeouts are measured in audio time, so file sources behave like a
+        live microphone regardless of how fast they are read.
+        """
+        frames = list(self.iter_phrase(timeout, phrase_time_limit))
+        return b"".join(frames) if frames else None
+    
+    def iter_phrase(self, timeout: Optional[float] = None,
+                    phrase_time_limit: Optional[float] = None) -> Iterator[bytes]:
+        """Yield the next phrase chunk by chunk as it is captured
+        
+        The first chunk includes the pre-roll. Nothing is yielded if no
+        phrase starts within timeout.
+        """
+        pre_roll: deque = deque(maxlen=max(1, int(PRE_ROLL_SECONDS / self.chunk_seconds)))
+        waited = 0.0
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return
+            data, energy = chunk
+            if energy > self.energy_threshold:
+                break
+            pre_roll.append(data)
+            waited += self.chunk_seconds
+            if timeout is not None and waited >= timeout:
+                return
+        
+        yield b"".join(pre_roll) + data
+        duration = self.chunk_seconds
+        silence = 0.0
+        while phrase_time_limit is None or duration < phrase_time_limit:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return
+            data, energy = chunk
+            yield data
+            duration += self.chunk_seconds
+            if energy > self.energy_threshold:
+                silence = 0.0
+            else:
+                silence += self.chunk_seconds
+                if silence >= self.pause_threshold:
+                    return
+    
+    def _next_chunk(self) -> Optional[Tuple[bytes, float]]:
+        """Return the next unread chunk, waiting for the capture thread"""
+        with self._cond:
+            while self._read_seq >= self._next_seq:
+                if self.exhausted or self._stopped:
+                    return None
+                if not self._cond.wait(AUDIO_STALL_SECONDS):
+                    logger.error("Audio source stalled")
+                    return None
+            
+            # A reader that fell behind a live source skips the lost audio
+            oldest = self._chunks[0][0]
+            self._read_seq = max(self._read_seq, oldest)
+            _, data, energy = self._chunks[self._read_seq - oldest]
+            self._read_seq += 1
+            self._cond.notify_all()
+            return data, energy
+    
+    def _run(self) -> None:
+        calibration_chunks = max(1, int(CALIBRATION_SECONDS / self.chunk_seconds))
+        while True:
+            try:
+                data = self.source.read()
+            except Exception as e:
+                logger.error(f"Audio capture error: {e}")
+                data = b""
+            
+            with self._cond:
+                if not data or self._stopped:
+                    self.exhausted = True
+                    self._cond.notify_all()
+                    return
+                
+                energy = pcm_rms(data)
+                if self._next_seq < calibration_chunks or energy <= self.energy_threshold:
+                    self._track_ambient(energy)
+                
+                if not self.source.live:
+                    # Back-pressure: keep every chunk until it has been read
+                    while (len(self._chunks) >= self._capacity and not self._stopped
+                           and self._chunks[0][0] >= self._read_seq):
+                        self._cond.wait()
+                
+                self._chunks.append((self._next_seq, data, energy))
+                self._next_seq += 1
+                while len(self._chunks) > self._capacity:
+                    self._chunks.popleft()
+                self._cond.notify_all()
+    
+    def _track_ambient(self, energy: float) -> None:
+        """Fold a background chunk into the ambient level and threshold"""
+        if self._ambient is None:
+            self._ambient = energy
+        else:
+            self._ambient = AMBIENT_DECAY * self._ambient + (1 - AMBIENT_DECAY) * energy
+        self.energy_threshold = max(MIN_ENERGY_THRESHOLD, self._ambient * ENERGY_RATIO)
+
+
+class HotwordDetector:
+    """On-device keyword spotter for the hotword, using pocketsphinx
+    
+    Runs on phrases already gated by AudioCapture's energy detection, and
+    skips ones too short to contain the hotword, so cloud recognition is
+    only needed after the hotword fires. Raises ImportError if pocketsphinx
+    is not installed.
+    """
+    
+    def __init__(self, hotword: str, threshold: float = HOTWORD_THRESHOLD,
+                 min_seconds: float = HOTWORD_MIN_SECONDS):
+        from pocketsphinx import Decoder
+        
+        self.hotword = hotword.lower()
+        self.min_seconds = min_seconds
+        self._decoder = Decoder(keyphrase=self.hotword, kws_threshold=threshold, logfn=os.devnull)
+    
+    def detect(self, pcm: bytes, sample_rate: int, sample_width: int = 2) -> bool:
+        """Return True if the hotword occurs in a phrase of PCM audio"""
+        if len(pcm) / sample_width / sample_rate < self.min_seconds:
+            return False
+        
+        self._decoder.start_utt()
+        self._decoder.process_raw(resample_pcm(pcm, sample_rate, sample_width), full_utt=True)
+        self._decoder.end_utt()
+        return self._decoder.hyp() is not None
+
+
+class RecognizerBackend:
+    """Speech-to-text engine used by listen and continuous_listen
+    
+    Backends implement transcribe(). Audio is also fed phrase by phrase
+    through begin/feed/end; streaming backends override these so feed()
+    returns partial hypotheses while the user is still speaking, the rest
+    simply transcribe the whole phrase in end(). One phrase is decoded at
+    a time. An empty transcript means the audio was not understood.
+    """
+    
+    name = "base"
+    streaming = False
+    
+    def transcribe(self, pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        raise NotImplementedError
+    
+    def begin(self, sample_rate: int, sample_width: int) -> None:
+        self._format = (sample_rate, sample_width)
+        self._chunks: List[bytes] = []
+    
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """Add audio to the current phrase; return a new partial hypothesis"""
+        self._chunks.append(chunk)
+        return None
+    
+    def end(self) -> str:
+        return self.transcribe(b"".join(self._chunks), *self._format)
+
+
+class GoogleRecognizer(RecognizerBackend):
+    """Cloud recognition with the Google Web Speech API"""
+    
+    name = "google"
+    
+    def __init__(self, language: str = "en-US"):
+        load_speech_modules()
+        self.language = language
+        self._recognizer = sr.Recognizer()
+    
+    def transcribe(self, pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        try:
+            return self._recognizer.recognize_google(
+                sr.AudioData(pcm, sample_rate, sample_width), language=self.language
+            )
+        except sr.UnknownValueError:
+            return ""
+
+
+class SphinxRecognizer(RecognizerBackend):
+    """Offline streaming recognition with pocketsphinx
+    
+    Uses the bundled US English model unless decoder options (hmm, lm,
+    dict, ...) point elsewhere. Raises ImportError if pocketsphinx is not
+    installed.
+    """
+    
+    name = "sphinx"
+    streaming = True
+    
+    def __init__(self, decoder_options: Optional[Dict[str, Any]] = None):
+        from pocketsphinx import Decoder
+        
+        options = {"logfn": os.devnull}
+        options.update(decoder_options or {})
+        self._decoder = Decoder(**options)
+        self._in_utterance = False
+        self._partial = ""
+    
+    def transcribe(self, pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        self.begin(sample_rate, sample_width)
+        self.feed(pcm)
+        return self.end()
+    
+    def begin(self, sample_rate: int, sample_width: int) -> None:
+        if self._in_utterance:
+            # An earlier phrase was abandoned mid-stream
+            self._decoder.end_utt()
+        self._format = (sample_rate, sample_width)
+        self._partial = ""
+        self._decoder.start_utt()
+        self._in_utterance = True
+    
+    def feed(self, chunk: bytes) -> Optional[str]:
+        self._decoder.process_raw(resample_pcm(chunk, *self._format))
+        hypothesis = self._decoder.hyp()
+        text = hypothesis.hypstr if hypothesis else ""
+        if text and text != self._partial:
+            self._partial = text
+            return text
+        return None
+    
+    def end(self) -> str:
+        self._decoder.end_utt()
+        self._in_utterance = False
+        hypothesis = self._decoder.hyp()
+        return hypothesis.hypstr if hypothesis else ""
+
+
+class ReplayRecognizer(RecognizerBackend):
+    """Scripted transcripts for tests and benchmarks, ignoring the audio
+    
+    Each phrase consumes the next transcript from a list or a text file
+    with one transcript per line. Partial hypotheses reveal one more word
+    every REPLAY_WORD_SECONDS of audio, like a streaming recognizer.
+    """
+    
+    name = "replay"
+    streaming = True
+    
+    def __init__(self, transcripts: Any):
+        if isinstance(transcripts, str):
+            with open(transcripts, 'r', encoding='utf-8') as f:
+                transcripts = [line.strip() for line in f if line.strip()]
+        self._transcripts = deque(transcripts)
+        self._current: List[str] = []
+        self._seconds = 0.0
+        self._revealed = 0
+    
+    def transcribe(self, pcm: bytes, sample_rate: int, sample_width: int) -> str:
+        return self._transcripts.popleft() if self._transcripts else ""
+    
+    def begin(self, sample_rate: int, sample_width: int) -> None:
+        self._format = (sample_rate, sample_width)
+        self._current = self.transcribe(b"", sample_rate, sample_width).split()
+        self._seconds = 0.0
+        self._revealed = 0
+    
+    def feed(self, chunk: bytes) -> Optional[str]:
+        sample_rate, sample_width = self._format
+        self._seconds += len(chunk) / sample_width / sample_rate
+        words = min(len(self._current), int(self._seconds / REPLAY_WORD_SECONDS))
+        if words > self._revealed:
+            self._revealed = words
+            return " ".join(self._current[:words])
+        return None
+    
+    def end(self) -> str:
+        return " ".join(self._current)
+
+
+class SettingsStore:
+    """Small JSON settings file with atomic, coalesced writes
+    
+    save() only schedules a write; changes arriving within the save delay
+    are merged into a single write of the latest values.
+    """
+    
+    def __init__(self, path: str, delay: float = SETTINGS_SAVE_DELAY):
+        self.path = path
+        self.delay = delay
+        self._pending: Optional[Dict[str, Any]] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+    
+    def load(self) -> Dict[str, Any]:
+        """Return the stored settings, or {} if there are none"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                settings = json.load(f)
+            return settings if isinstance(settings, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Error loading settings: {e}")
+            return {}
+    
+    def save(self, settings: Dict[str, Any]) -> None:
+        """Schedule settings to be written after the save delay"""
+        with self._lock:
+            self._pending = dict(settings)
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.start()
+    
+    def flush(self) -> None:
+        """Write pending settings now"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            settings, self._pending = self._pending, None
+            if settings is None:
+                return
+            
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(settings, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                logger.info("Configuration saved")
+            except Exception as e:
+                logger.error(f"Error saving config: {e}")
+
+
 class Jarvis:
     """Advanced Jarvis AI Assistant with multi-modal capabilities"""
     
     def __init__(self, config_file: str = "jarvis_data.json"):
         self.config_file = config_file
-        self.config = self._load_config()
-        self.dataset = self._load_dataset()
+        self.startup_timings: Dict[str, float] = {"import": IMPORT_SECONDS}
+        # Parsed data file shared by _load_config and _load_dataset, which
+        # usually read the same file
+        self._source: Optional[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]] = None
+        with self._startup_stage("config"):
+            self.config = self._load_config()
+        self._configure_logging()
+        # Data file of the active language; other languages are loaded by
+        # select_language and parked in _partitions, least recently used first
+        self._data_file = self._language_data_file() or self.config.get("data_file", "jarvis_data.json")
+        self._data_signature: Optional[Tuple[int, int]] = None
+        self._partitions: "OrderedDict[str, DatasetPartition]" = OrderedDict()
+        self._partition_lock = threading.Lock()
+        metrics_config = self.config.get("metrics", {})
+        self.metrics = Metrics(enabled=bool(metrics_config.get("enabled", True)))
+        self._metrics_thread = None
+        self._metrics_stop = threading.Event()
+        with self._startup_stage("dataset"):
+            self.dataset = self._load_dataset()
+        self.dataset_version = 0
+        self.response_cache = self._create_response_cache()
+        # Guards the dataset and lookup tables against hot reloads
+        self._index_lock = ReadWriteLock()
+        # Process pool for similarity scoring, started by the first query
+        # that needs it when sharding is enabled
+        self._sharded_matcher: Optional[ShardedMatcher] = None
+        self._sharding_failed = False
+        self._matcher_lock = threading.Lock()
+        with self._startup_stage("index"):
+            self._build_index()
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+        if self.config.get("hot_reload", {}).get("enabled", True):
+            self.start_watching()
         self.engine = None
+        self.speech_queue: Optional[SpeechQueue] = None
         self.recognizer = None
+        self.audio_capture: Optional[AudioCapture] = None
+        self._capture_lock = threading.Lock()
+        # Match started from a partial hypothesis: (normalized text, Future)
+        self._speculation: Optional[Tuple[str, Future]] = None
+        self._speculation_executor: Optional[ThreadPoolExecutor] = None
         self.commands = self._initialize_commands()
         self.running = False
         self.voice_thread = None
         
-        # Initialize components
-        self._initialize_speech()
-        self._initialize_voice_commands()
+        # Speech components are initialized by the first speak/listen
+        self._speech_lock = threading.Lock()
+        self._speech_ready = False
+        self._log_startup_timings()
+        
+        log_interval = float(metrics_config.get("log_interval", 0) or 0)
+        if self.metrics.enabled and log_interval > 0:
+            self._metrics_thread = threading.Thread(
+                target=self._log_metrics, args=(log_interval,), daemon=True
+            )
+            self._metrics_thread.start()
+    
+    @classmethod
+    def for_server(cls, config_file: str = "jarvis_data.json", language: Optional[str] = None) -> "Jarvis":
+        """Create a text-only assistant for server.py and session_server.py
+        
+        With language the instance serves only that language's partition
+        and raises ValueError if it has no data file. The matching path is
+        primed before the first request.
+        """
+        assistant = cls(config_file)
+        # Never touch the audio stack from a server
+        assistant.config["voice_enabled"] = False
+        if language:
+            # This instance only ever serves one language
+            assistant.config.setdefault("partitions", {})["memory_budget_mb"] = 0
+            if not assistant.select_language(language):
+                assistant.stop_watching()
+                raise ValueError(f"No data for language {language!r}")
+        # Warm the matching path without counting a request in the metrics
+        with assistant._index_lock.read():
+            assistant._find_responses("jarvis")
+        return assistant
+    
+    @contextmanager
+    def _startup_stage(self, stage: str):
+        """Record the duration of a startup stage in startup_timings"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_timings[stage] = time.perf_counter() - started
+    
+    def _configure_logging(self) -> None:
+        """Apply the "logging" config block to the log handlers"""
+        log_config = self.config.get("logging", {})
+        self._log_requests = bool(log_config.get("log_requests", False))
+        if not _log_handlers:
+            # The embedding application configured logging itself
+            return
+        try:
+            configure_logging(
+                file=log_config.get("file", "jarvis.log"),
+                level=log_config.get("level", "INFO"),
+                mode=log_config.get("mode", "queue"),
+                max_bytes=int(log_config.get("max_bytes", LOG_MAX_BYTES)),
+                backup_count=int(log_config.get("backup_count", LOG_BACKUP_COUNT)),
+                rotate_when=log_config.get("rotate_when"),
+                json_lines=bool(log_config.get("json", False))
+            )
+        except Exception as e:
+            logger.error(f"Invalid logging config, keeping defaults: {e}")
+    
+    @contextmanager
+    def request(self, request_id: Optional[str] = None) -> Iterator[str]:
+        """Tag log records and stage timings in this block with a request id
+        
+        Nested blocks join the enclosing request. With logging.log_requests
+        set, one line with the per-stage timings is logged at the end.
+        """
+        state = _request_state.get()
+        if state is not None:
+            yield state["id"]
+            return
+        
+        state = {"id": request_id or uuid.uuid4().hex[:16], "stages": {}}
+        token = _request_state.set(state)
+        started = time.perf_counter()
+        try:
+            yield state["id"]
+        finally:
+            if self._log_requests:
+                stages = {stage: round(seconds * 1000, 3) for stage, seconds in state["stages"].items()}
+                breakdown = ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in stages.items())
+                logger.info(
+                    f"Request finished in {(time.perf_counter() - started) * 1000:.1f}ms"
+                    + (f" ({breakdown})" if breakdown else ""),
+                    extra={"stages": stages}
+                )
+            _request_state.reset(token)
+    
+    def _log_startup_timings(self) -> None:
+        """Log how long each startup stage took"""
+        stages = ["import", "config", "dataset", "index", "speech"]
+        report = ", ".join(
+            f"{stage}={self.startup_timings[stage] * 1000:.1f}ms"
+            if stage in self.startup_timings else f"{stage}=deferred"
+            for stage in stages
+        )
+        logger.info(f"Startup timings: {report}")
         
+        # Steady-state size of the loaded dataset and index, and the peak
+        # reached while loading
+        memory = memory_usage()
+        if memory:
+            logger.info("Memory after startup: " + ", ".join(
+                f"{name}={value:.1f}MB" for name, value in memory.items()
+            ))
+    
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration with intelligent defaults"""
         default_config = {
@@ -49,40 +1907,102 @@ class Jarvis:
             "hotword": "jarvis",
             "voice_rate": 150,
             "voice_volume": 1.0,
+            "settings_file": "jarvis_settings.json",
             "features": {
                 "web_search": True,
                 "system_control": True,
                 "multilingual": True
+            },
+            "cache": {
+                "enabled": True,
+                "max_size": 1024,
+                "ttl": 0
+            },
+            "hot_reload": {
+                "enabled": True,
+                "interval": 2.0
+            },
+            "typo_correction": {
+                "enabled": True,
+                "max_distance": 2
+            },
+            "partitions": {
+                "default_language": "en",
+                "files": {},
+                "memory_budget_mb": 256
+            },
+            "hotword_detection": {
+                "engine": "sphinx",
+                "threshold": HOTWORD_THRESHOLD,
+                "min_seconds": HOTWORD_MIN_SECONDS
+            },
+            "sharding": {
+                "enabled": False,
+                "workers": 0,
+                "min_conversations": SHARDING_MIN_CONVERSATIONS
+            },
+            "metrics": {
+                "enabled": True,
+                "log_interval": 0
+            },
+            "logging": {
+                "file": "jarvis.log",
+                "level": "INFO",
+                "mode": "queue",
+                "max_bytes": LOG_MAX_BYTES,
+                "backup_count": LOG_BACKUP_COUNT,
+                "rotate_when": None,
+                "json": False,
+                "log_requests": False
+            },
+            "recognition": {
+                "backend": "google",
+                "language": "en-US",
+                "sphinx": {},
+                "transcripts": None,
+                "speculative": True
+            },
+            "audio": {
+                "source": "microphone",
+                "sample_rate": 16000,
+                "realtime": False,
+                "buffer_seconds": 10.0
             }
         }
         
         try:
             if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    # Deep merge for nested dictionaries
-                    for key, value in config.items():
-                        if isinstance(value, dict) and key in default_config:
-                            default_config[key].update(value)
-                        else:
-                            default_config[key] = value
+                config = self._read_data_file(self.config_file)
+                # Deep merge for nested dictionaries
+                for key, value in config.items():
+                    if isinstance(value, CategoryRecord):
+                        # Dataset categories are not configuration
+                        continue
+                    if isinstance(value, dict) and key in default_config:
+                        default_config[key].update(value)
+                    else:
+                        default_config[key] = value
         except Exception as e:
             logger.error(f"Error loading config: {e}")
         
+        # Settings changed at runtime override the config file
+        self.settings_store = SettingsStore(default_config["settings_file"])
+        for key, value in self.settings_store.load().items():
+            if key in PERSISTED_SETTINGS:
+                default_config[key] = value
+        
         return default_config
     
     def _load_dataset(self) -> Dict[str, Any]:
-        """Load dataset directly from JSON file"""
+        """Load the active language's dataset directly from its JSON file"""
         try:
-            data_file = self.config.get("data_file", "jarvis_data.json")
+            data_file = self._data_file
+            self._data_signature = file_signature(data_file)
             if not os.path.exists(data_file):
                 logger.error(f"Data file {data_file} not found")
                 return {}
             
-            with open(data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            return data
+            return self._read_data_file(data_file)
                 
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in data file: {e}")
@@ -91,49 +2011,336 @@ class Jarvis:
             logger.error(f"Error loading dataset: {e}")
             return {}
     
+    def _create_response_cache(self) -> Optional[ResponseCache]:
+        """Create the response cache described by the "cache" config block"""
+        cache_config = self.config.get("cache", {})
+        if not cache_config.get("enabled", True):
+            return None
+        max_size = int(cache_config.get("max_size", 1024))
+        if max_size <= 0:
+            return None
+        return ResponseCache(max_size=max_size, ttl=float(cache_config.get("ttl", 0)))
+    
+    def _read_data_file(self, path: str) -> Dict[str, Any]:
+        """Parse a JSON data file once, preferring its compiled snapshot"""
+        key = os.path.abspath(path)
+        if self._source and self._source[0] == key:
+            return self._source[1]
+        
+        snapshot = load_snapshot(path)
+        if snapshot:
+            logger.info(f"Loaded compiled snapshot for {path}")
+            data = snapshot["dataset"]
+        else:
+            data = load_data_file(path)
+        
+        self._source = (key, data, snapshot)
+        return data
+    
+    def _build_index(self) -> None:
+        """Build exact-match and token lookup structures over the dataset"""
+        data_file = os.path.abspath(self._data_file)
+        source, self._source = self._source, None
+        if source and source[0] == data_file and source[2]:
+            # Precomputed tables from the snapshot the dataset came from
+            snapshot = source[2]
+            tables = (snapshot["exact_index"], snapshot["conversations"], snapshot["token_index"])
+        else:
+            tables = build_lookup_tables(self.dataset)
+        
+        self._exact_index, self._conversations, self._token_index = tables
+        self._tombstones = 0
+        # Sparse corpus matrix for process_commands and the typo index over
+        # the token vocabulary, both built on first use
+        self._corpus_matrix = None
+        self._typo_index = None
+        
+        # Cached responses belong to the previous dataset
+        self.dataset_version += 1
+        if self.response_cache:
+            self.response_cache.clear()
+        
+        logger.info(
+            f"Indexed {len(self._conversations)} conversations, "
+            f"{len(self._exact_index)} distinct prompts, "
+            f"{len(self._token_index)} tokens"
+        )
+    
+    def reload_dataset(self) -> bool:
+        """Re-read the data file and apply only the changed conversations
+        
+        Returns True if the lookup tables changed. Queries are blocked only
+        while the changes are applied, never while the file is parsed.
+        """
+        # A language switch must not swap the dataset mid-reload
+        with self._partition_lock:
+            return self._reload_dataset()
+    
+    def _reload_dataset(self) -> bool:
+        """reload_dataset body; the caller holds the partition lock"""
+        data_file = self._data_file
+        # Recorded even if parsing fails, so a broken file is retried only
+        # once it changes again
+        self._data_signature = file_signature(data_file)
+        try:
+            new_dataset = self._read_data_file(data_file)
+        except Exception as e:
+            # Keep serving the current dataset, e.g. during a partial write
+            logger.error(f"Error reloading dataset: {e}")
+            return False
+        finally:
+            self._source = None
+        
+        removed, added = diff_conversations(self.dataset, new_dataset)
+        with self._index_lock.write():
+            self.dataset = new_dataset
+            if not removed and not added:
+                return False
+            
+            tables = (self._exact_index, self._conversations, self._token_index)
+            for user_text, response_text in removed:
+                if remove_conversation(tables, user_text, response_text):
+                    self._tombstones += 1
+            
+            if self._tombstones > len(self._conversations) // 2:
+                # Mostly tombstones: a full rebuild is cheaper to query
+                self._build_index()
+            else:
+                for user_text, response_text in added:
+                    add_conversation(tables, user_text, response_text)
+                self._corpus_matrix = None
+                self._typo_index = None
+                self.dataset_version += 1
+                if self.response_cache:
+                    self.response_cache.clear()
+            
+            if self._sharded_matcher:
+                # Workers must see the new tables before queries resume
+                self._reload_sharded_matcher()
+        
+        logger.info(f"Reloaded {data_file}: {len(removed)} removed, {len(added)} added")
+        return True
+    
+    def start_watching(self) -> None:
+        """Start polling the data file for changes in a background thread"""
+        if self._watch_thread and self._watch_thread.is_alive():
+            return
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=self._watch_data_file, daemon=True)
+        self._watch_thread.start()
+    
+    def stop_watching(self) -> None:
+        """Stop the data file watcher"""
+        self._watch_stop.set()
+        if self._watch_thread and self._watch_thread.is_alive():
+            self._watch_thread.join(timeout=1)
+    
+    def _watch_data_file(self) -> None:
+        """Poll the data file's mtime and size and reload it once they settle"""
+        interval = float(self.config.get("hot_reload", {}).get("interval", 2.0))
+        
+        previous = None
+        while not self._watch_stop.wait(interval):
+            # Follows the active language's file across language switches
+            current = file_signature(self._data_file)
+            # Wait for the file to stop changing so a save in progress is
+            # not picked up half-written
+            stable = current == previous
+            previous = current
+            if current is None or current == self._data_signature or not stable:
+                continue
+            try:
+                self.reload_dataset()
+            except Exception as e:
+                logger.error(f"Error applying dataset reload: {e}")
+    
+    def _language_data_file(self, language: Optional[str] = None) -> Optional[str]:
+        """Data file of a language (default: the configured one), or None
+        
+        partitions.files maps language codes to data files; the default
+        language is served from data_file.
+        """
+        partitions_config = self.config.get("partitions", {})
+        language = language or self.config.get("language", "en")
+        files = partitions_config.get("files") or {}
+        if language in files:
+            return files[language]
+        if language == partitions_config.get("default_language", "en"):
+            return self.config.get("data_file", "jarvis_data.json")
+        return None
+    
+    def select_language(self, language: str) -> bool:
+        """Match queries against a language's knowledge base from now on
+        
+        The language's partition is loaded the first time it is selected.
+        The partition it replaces stays in memory for a quick switch back
+        until the memory budget evicts it. Returns False if the language
+        has no data file or it cannot be loaded.
+        """
+        data_file = self._language_data_file(language)
+        if data_file is None:
+            return False
+        
+        with self._partition_lock:
+            if os.path.abspath(data_file) != os.path.abspath(self._data_file):
+                partition = self._partitions.pop(os.path.abspath(data_file), None)
+                if partition and partition.signature != file_signature(data_file):
+                    # Edited while parked; hot reload only follows the active file
+                    partition = None
+                if partition is None:
+                    try:
+                        partition = self._load_partition(data_file)
+                    except Exception as e:
+                        logger.error(f"Error loading {language} data from {data_file}: {e}")
+                        return False
+                self._activate_partition(partition)
+            self.config["language"] = language
+        return True
+    
+    def _load_partition(self, data_file: str) -> DatasetPartition:
+        """Read a data file and build its lookup tables, without activating it"""
+        started = time.perf_counter()
+        signature = file_signature(data_file)
+        if signature is None:
+            raise FileNotFoundError(data_file)
+        try:
+            dataset = self._read_data_file(data_file)
+            snapshot = self._source[2] if self._source else None
+        finally:
+            self._source = None
+        if snapshot:
+            tables = (snapshot["exact_index"], snapshot["conversations"], snapshot["token_index"])
+        else:
+            tables = build_lookup_tables(dataset)
+        logger.info(
+            f"Loaded {data_file}: {len(tables[1])} conversations "
+            f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+        )
+        return DatasetPartition(data_file, signature, dataset, tables)
+    
+    def _activate_partition(self, partition: DatasetPartition) -> None:
+        """Swap partition in for the active one, which is parked"""
+        parked = DatasetPartition(
+            self._data_file, self._data_signature, self.dataset,
+            (self._exact_index, self._conversations, self._token_index), self._tombstones
+        )
+        with self._index_lock.write():
+            self._data_file = partition.data_file
+            self._data_signature = partition.signature
+            self.dataset = partition.dataset
+            self._exact_index, self._conversations, self._token_index = partition.tables
+            self._tombstones = partition.tombstones
+            self._corpus_matrix = None
+            self._typo_index = None
+            self.dataset_version += 1
+            if self.response_cache:
+                self.response_cache.clear()
+            if self._sharded_matcher:
+                self._reload_sharded_matcher()
+        
+        self._partitions[os.path.abspath(parked.data_file)] = parked
+        self._evict_partitions()
+    
+    def _evict_partitions(self) -> None:
+        """Drop least recently used parked partitions beyond the memory budget"""
+        budget = float(self.config.get("partitions", {}).get("memory_budget_mb", 256)) * 2 ** 20
+        parked = sum(partition.size for partition in self._partitions.values())
+        while self._partitions and parked > budget:
+            _, partition = self._partitions.popitem(last=False)
+            parked -= partition.size
+            logger.info(f"Evicted {partition.data_file} from memory")
+    
+    def _log_metrics(self, interval: float) -> None:
+        """Write a metrics snapshot to the log every interval seconds"""
+        while not self._metrics_stop.wait(interval):
+            logger.info(f"Metrics: {self.metrics.summary()}")
+    
     def _get_fallback_data(self) -> Dict[str, Any]:
         """Return empty fallback data - no longer used"""
         return {}
     
+    def _ensure_speech(self) -> bool:
+        """Initialize the speech stack on first use; False if voice is off"""
+        if not self.config.get("voice_enabled", True):
+            return False
+        
+        with self._speech_lock:
+            if not self._speech_ready:
+                with self._startup_stage("speech"):
+                    try:
+                        load_speech_modules()
+                    except Exception as e:
+                        logger.error(f"Speech modules unavailable: {e}")
+                        self.config["voice_enabled"] = False
+                    else:
+                        self._initialize_speech()
+                        self._initialize_voice_commands()
+                self._speech_ready = True
+                logger.info(f"Speech startup took {self.startup_timings['speech'] * 1000:.1f}ms")
+        
+        return self.config.get("voice_enabled", True)
+    
     def _initialize_speech(self) -> None:
-        """Initialize speech engine with robust error handling"""
+        """Start the TTS worker with robust error handling"""
         try:
+            if self.speech_queue:
+                self.speech_queue.shutdown(wait=False)
+                self.speech_queue = None
+                self.engine = None
+            
             if self.config.get("voice_enabled", True):
-                self.engine = pyttsx3.init()
-                self.recognizer = sr.Recognizer()
-                
-                # Configure speech engine properties
-                if self.engine:
-                    voices = self.engine.getProperty('voices')
-                    if voices:
-                        # Try to select a natural-sounding voice
-                        preferred_voices = [
-                            v.id for v in voices 
-                            if 'english' in v.id.lower() or 'default' in v.id.lower()
-                        ]
-                        if preferred_voices:
-                            self.engine.setProperty('voice', preferred_voices[0])
-                    
-                    self.engine.setProperty('rate', self.config.get("voice_rate", 150))
-                    self.engine.setProperty('volume', self.config.get("voice_volume", 1.0))
-                
+                # The engine is created on, and only used by, the worker thread
+                self.speech_queue = SpeechQueue(self._create_engine, metrics=self.metrics)
+                self.engine = self.speech_queue.start()
                 logger.info("Speech engine initialized successfully")
                 
         except Exception as e:
             logger.error(f"Failed to initialize speech engine: {e}")
+            self.speech_queue = None
             self.config["voice_enabled"] = False
     
+    def _create_engine(self) -> Any:
+        """Create and configure the pyttsx3 engine"""
+        engine = pyttsx3.init()
+        
+        # Configure speech engine properties
+        if engine:
+            voices = engine.getProperty('voices')
+            if voices:
+                # Try to select a natural-sounding voice
+                preferred_voices = [
+                    v.id for v in voices 
+                    if 'english' in v.id.lower() or 'default' in v.id.lower()
+                ]
+                if preferred_voices:
+                    engine.setProperty('voice', preferred_voices[0])
+            
+            engine.setProperty('rate', self.config.get("voice_rate", 150))
+            engine.setProperty('volume', self.config.get("voice_volume", 1.0))
+        
+        return engine
+    
     def _initialize_voice_commands(self) -> None:
         """Initialize voice command recognition system"""
         try:
             if self.config.get("voice_enabled", True):
-                self.recognizer = sr.Recognizer()
-                self.recognizer.dynamic_energy_threshold = True
-                self.recognizer.pause_threshold = 0.8
-                logger.info("Voice command system ready")
+                self.recognizer = self._create_recognizer()
+                logger.info(f"Voice command system ready ({self.recognizer.name} recognition)")
         except Exception as e:
             logger.error(f"Failed to initialize voice commands: {e}")
     
+    def _create_recognizer(self) -> RecognizerBackend:
+        """Create the backend named by the "recognition" config block"""
+        recognition_config = self.config.get("recognition", {})
+        backend = recognition_config.get("backend", "google")
+        if backend == "sphinx":
+            return SphinxRecognizer(recognition_config.get("sphinx"))
+        if backend == "replay":
+            return ReplayRecognizer(recognition_config.get("transcripts") or [])
+        if backend != "google":
+            logger.warning(f"Unknown recognition backend {backend}, using google")
+        return GoogleRecognizer(recognition_config.get("language", "en-US"))
+    
     def _initialize_commands(self) -> Dict[str, Callable]:
         """Initialize all available commands with metadata"""
         return {
@@ -176,49 +2383,133 @@ class Jarvis:
             }
         }
     
-    def speak(self, text: str, priority: int = 1) -> None:
-        """Convert text to speech with priority-based queuing"""
+    def speak(self, text: str, priority: int = 1) -> Optional[Future]:
+        """Queue text for speech and return its handle without waiting
+        
+        Priority runs from 1 (highest) to 3. The returned Future resolves
+        when playback finishes; None means voice output is off.
+        """
         print(f"Jarvis: {text}")
-        if self.config.get("voice_enabled", True) and self.engine:
-            try:
-                # Simple priority system (1-3, 1 being highest)
-                if priority == 1:
-                    self.engine.say(text)
-                    self.engine.runAndWait()
+        if self._ensure_speech() and self.speech_queue:
+            return self.speech_queue.submit(text, priority)
+        return None
+    
+    def _get_audio_capture(self) -> AudioCapture:
+        """Open the configured audio source once and start capturing"""
+        with self._capture_lock:
+            if self.audio_capture is None:
+                audio_config = self.config.get("audio", {})
+                source_name = audio_config.get("source", "microphone")
+                if source_name == "microphone":
+                    source = MicrophoneSource()
                 else:
-                    # Lower priority responses can be queued
-                    def speak_thread():
-                        self.engine.say(text)
-                        self.engine.runAndWait()
-                    
-                    threading.Thread(target=speak_thread).start()
-            except Exception as e:
-                logger.error(f"Speech synthesis error: {e}")
+                    # WAV/raw PCM replay for headless testing and benchmarks
+                    source = FileAudioSource(
+                        source_name,
+                        sample_rate=int(audio_config.get("sample_rate", 16000)),
+                        realtime=bool(audio_config.get("realtime", False))
+                    )
+                
+                self.audio_capture = AudioCapture(
+                    source,
+                    buffer_seconds=float(audio_config.get("buffer_seconds", 10.0)),
+                    pause_threshold=PAUSE_THRESHOLD
+                )
+                self.audio_capture.start()
+                logger.info(f"Audio capture started from {source_name}")
+            return self.audio_capture
+    
+    def _recognize(self, pcm: bytes, capture: AudioCapture) -> str:
+        """Transcribe a captured phrase with the recognizer backend"""
+        with self.metrics.time("stt"):
+            return self.recognizer.transcribe(pcm, capture.sample_rate, capture.sample_width)
+    
+    def _recognize_stream(self, capture: AudioCapture, timeout: float,
+                          phrase_time_limit: float) -> Optional[str]:
+        """Transcribe the next phrase while it is being captured
+        
+        With a streaming backend each new partial hypothesis starts a
+        speculative match. Returns None if no phrase starts in time.
+        """
+        speculative = (self.recognizer.streaming
+                       and self.config.get("recognition", {}).get("speculative", True))
+        started = False
+        for chunk in capture.iter_phrase(timeout=timeout, phrase_time_limit=phrase_time_limit):
+            if not started:
+                self.recognizer.begin(capture.sample_rate, capture.sample_width)
+                started = True
+                logger.info("Processing speech...")
+            partial = self.recognizer.feed(chunk)
+            if partial:
+                logger.debug(f"Partial: {partial}")
+                if speculative:
+                    self._speculate(partial)
+        
+        if not started:
+            return None
+        # Only the decoding left after the phrase ends delays the response
+        with self.metrics.time("stt"):
+            return self.recognizer.end()
+    
+    def _speculate(self, partial: str) -> None:
+        """Start matching a partial hypothesis before the phrase ends"""
+        text = partial.lower().strip()
+        if self._speculation and self._speculation[0] == text:
+            return
+        if self._speculation:
+            self._speculation[1].cancel()
+        if self._speculation_executor is None:
+            self._speculation_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="jarvis-speculate"
+            )
+        self._speculation = (text, self._speculation_executor.submit(self._speculative_match, text))
+    
+    def _speculative_match(self, text: str) -> Tuple[str, float]:
+        """match() without metrics or the response cache
+        
+        Most partials are abandoned, so only the claimed result is counted.
+        """
+        if not text:
+            return "", 0.0
+        with self._index_lock.read():
+            (candidates, score), _ = self._find_responses(text)
+        return (random.choice(candidates) if candidates else ""), score
+    
+    def _claim_speculation(self, user_input: str) -> Optional[Tuple[str, float]]:
+        """Return the speculative match for the final input, if it has one"""
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        text, future = speculation
+        if text != user_input.lower().strip() or future.cancelled():
+            # The final transcript differs from the last partial
+            future.cancel()
+            return None
+        result = future.result()
+        self.metrics.inc("jarvis_requests_total")
+        self.metrics.observe("jarvis_match_score", result[1], buckets=SCORE_BUCKETS)
+        return result
     
     def listen(self, timeout: int = 5) -> Optional[str]:
         """Listen for voice input with adaptive timeout"""
-        if not self.config.get("voice_enabled", True) or not self.recognizer:
+        if not self._ensure_speech() or not self.recognizer:
             return None
             
         try:
-            with sr.Microphone() as source:
-                logger.info("Adjusting for ambient noise...")
-                self.recognizer.adjust_for_ambient_noise(source, duration=1)
-                
-                logger.info(f"Listening for {timeout} seconds...")
-                audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=timeout)
-                
-                logger.info("Processing speech...")
-                text = self.recognizer.recognize_google(audio)
-                logger.info(f"Recognized: {text}")
-                return text.lower()
+            capture = self._get_audio_capture()
+            
+            logger.info(f"Listening for {timeout} seconds...")
+            text = self._recognize_stream(capture, timeout=timeout, phrase_time_limit=timeout)
+            if text is None:
+                logger.debug("Listening timeout")
+                return None
+            if not text:
+                logger.debug("Could not understand audio")
+                return None
+            
+            logger.info(f"Recognized: {text}")
+            return text.lower()
                 
-        except sr.WaitTimeoutError:
-            logger.debug("Listening timeout")
-            return None
-        except sr.UnknownValueError:
-            logger.debug("Could not understand audio")
-            return None
         except sr.RequestError as e:
             logger.error(f"Speech recognition service error: {e}")
             return None
@@ -226,29 +2517,66 @@ class Jarvis:
             logger.error(f"Speech recognition error: {e}")
             return None
     
+    def _create_hotword_detector(self) -> Optional[HotwordDetector]:
+        """Create the offline hotword detector, or None to use the cloud"""
+        detection_config = self.config.get("hotword_detection", {})
+        if detection_config.get("engine", "sphinx") != "sphinx":
+            return None
+        try:
+            return HotwordDetector(
+                self.config.get("hotword", "jarvis"),
+                threshold=float(detection_config.get("threshold", HOTWORD_THRESHOLD)),
+                min_seconds=float(detection_config.get("min_seconds", HOTWORD_MIN_SECONDS))
+            )
+        except Exception as e:
+            logger.warning(f"Offline hotword detection unavailable, using cloud recognition: {e}")
+            return None
+    
     def continuous_listen(self) -> None:
         """Continuous listening mode with hotword detection"""
+        if not self._ensure_speech() or not self.recognizer:
+            logger.error("Voice mode requires a working speech stack")
+            return
+        
         hotword = self.config.get("hotword", "jarvis").lower()
         pattern = re.compile(rf'\b{hotword}\b', re.IGNORECASE)
+        detector = self._create_hotword_detector()
+        
+        try:
+            capture = self._get_audio_capture()
+        except Exception as e:
+            logger.error(f"Could not open audio source: {e}")
+            return
         
         while self.running:
             try:
-                with sr.Microphone() as source:
-                    self.recognizer.adjust_for_ambient_noise(source)
-                    logger.info("Waiting for hotword...")
-                    audio = self.recognizer.listen(source, timeout=3)
+                logger.info("Waiting for hotword...")
+                pcm = capture.read_phrase(timeout=3)
+                if not pcm:
+                    if capture.exhausted:
+                        break
+                    continue
+                
+                try:
+                    if detector:
+                        # Spot the hotword locally; only commands go to the cloud
+                        with self.metrics.time("hotword"):
+                            heard = detector.detect(pcm, capture.sample_rate, capture.sample_width)
+                    else:
+                        heard = bool(pattern.search(self._recognize(pcm, capture).lower()))
                     
-                    try:
-                        text = self.recognizer.recognize_google(audio).lower()
-                        if pattern.search(text):
-                            self.speak("Yes? How can I help?", priority=1)
+                    if heard:
+                        prompt = self.speak("Yes? How can I help?", priority=1)
+                        # Don't record our own prompt as the command
+                        if prompt:
+                            wait_futures([prompt], timeout=5)
+                            capture.flush()
+                        with self.request():
                             command = self.listen(timeout=8)
                             if command:
                                 self.process_command(command)
-                    except sr.UnknownValueError:
-                        continue
-                    except Exception as e:
-                        logger.error(f"Error in continuous listen: {e}")
+                except Exception as e:
+                    logger.error(f"Error in continuous listen: {e}")
                         
             except Exception as e:
                 logger.error(f"Error in continuous listening loop: {e}")
@@ -259,84 +2587,379 @@ class Jarvis:
         if not user_input:
             return ""
         
-        user_input = user_input.lower().strip()
+        with self.request():
+            # Voice input may already have been matched from a partial result
+            result = self._claim_speculation(user_input)
+            response, _ = result if result else self.match(user_input)
+            
+            # If no good match found in JSON, search Google
+            if not response:
+                self.metrics.inc("jarvis_web_search_fallbacks_total")
+                with self.metrics.time("web_search"):
+                    return self._search_google(user_input.lower().strip())
+            
+            return response
+    
+    def match(self, user_input: str) -> Tuple[str, float]:
+        """Return a dataset response and its match score, without side effects
+        
+        Exact hits score 1.0. The response is "" when nothing in the dataset
+        scores above the similarity threshold.
+        """
+        user_input = (user_input or "").lower().strip()
+        if not user_input:
+            return "", 0.0
+        
+        # Repeated prompts pick among their variants on every call
+        self.metrics.inc("jarvis_requests_total")
+        candidates, score = self._lookup_responses(user_input)
+        self.metrics.observe("jarvis_match_score", score, buckets=SCORE_BUCKETS)
+        if not candidates:
+            return "", score
         
+        return random.choice(candidates), score
+    
+    def _lookup_responses(self, user_input: str) -> CandidateMatch:
+        """Return candidate responses for normalized input, using the cache"""
+        with self._index_lock.read():
+            if self.response_cache:
+                cached = self.response_cache.get(user_input)
+                if cached is not None:
+                    self.metrics.inc("jarvis_cache_hits_total")
+                    return cached
+                self.metrics.inc("jarvis_cache_misses_total")
+            
+            started = time.perf_counter()
+            result, stage = self._find_responses(user_input)
+            self.metrics.observe_stage(stage, time.perf_counter() - started)
+            
+            # Stored under the read lock so a reload cannot interleave
+            if self.response_cache:
+                self.response_cache.put(user_input, result)
+            
+            return result
+    
+    def _find_responses(self, user_input: str) -> Tuple[CandidateMatch, str]:
+        """Match normalized input against the tables, returning the result
+        and the stage that produced it; the caller holds the index read lock
+        """
         # First try exact match
-        for category_data in self.dataset.values():
-            if isinstance(category_data, dict) and "conversations" in category_data:
-                conversations = category_data["conversations"]
-                for conv in conversations:
-                    if conv.get("user", "").lower().strip() == user_input:
-                        return conv.get("bot", "")
+        candidates = self._exact_index.get(user_input)
+        if candidates:
+            # Copy so a reload editing the table cannot change it
+            return (list(candidates), 1.0), "exact_match"
         
         # If no exact match, use similarity-based matching
-        json_response = self._find_similar_response(user_input)
+        json_response, score = self._best_match(user_input)
+        stage = "similarity_match"
+        # Misspelled words drag the score down, often below the threshold
+        corrected_response, corrected_score = self._typo_match(user_input)
+        if corrected_response and corrected_score > score:
+            json_response, score = corrected_response, corrected_score
+            stage = "typo_match"
+        return ([json_response] if json_response else [], score), stage
+    
+    def process_commands(self, batch: List[str]) -> List[Tuple[str, float]]:
+        """Match a batch of inputs against the dataset without side effects
+        
+        Returns a (response, score) pair per input. Exact hits score 1.0;
+        otherwise the response is the best similarity match, or "" when the
+        best score is at or below the threshold. Unlike process_command no
+        web search fallback is triggered.
+        """
+        self.metrics.inc("jarvis_requests_total", len(batch))
+        with self._index_lock.read(), self.metrics.time("batch_match"):
+            return self._match_batch(batch)
+    
+    def _match_batch(self, batch: List[str]) -> List[Tuple[str, float]]:
+        """process_commands body; the caller holds the index read lock"""
+        results: List[Tuple[str, float]] = [("", 0.0)] * len(batch)
+        pending: List[Tuple[int, str]] = []
+        
+        for i, user_input in enumerate(batch):
+            user_input = (user_input or "").lower().strip()
+            if not user_input:
+                continue
+            candidates = self._exact_index.get(user_input)
+            if candidates:
+                results[i] = (random.choice(candidates), 1.0)
+            else:
+                pending.append((i, user_input))
+        
+        self._score_pending(pending, results)
+        
+        # Respell unknown words across the whole batch, then score the
+        # corrected inputs together; a correction wins only if it scores higher
+        corrections: Dict[str, Optional[str]] = {}
+        respelled: List[Tuple[int, str]] = []
+        for i, user_input in pending:
+            corrected = self._correct_typos(user_input, corrections)
+            if corrected is not None:
+                respelled.append((i, corrected))
+        
+        corrected_results = [("", 0.0)] * len(batch)
+        self._score_pending(respelled, corrected_results)
+        for i, _ in respelled:
+            corrected = corrected_results[i]
+            if corrected[0] and corrected[1] > results[i][1]:
+                results[i] = corrected
+        
+        return results
+    
+    def _score_pending(self, pending: List[Tuple[int, str]], results: List[Tuple[str, float]]) -> None:
+        """Store the best match for each (position, input) in results"""
+        if not load_vector_modules():
+            for i, user_input in pending:
+                results[i] = self._best_match(user_input)
+            return
+        
+        for start in range(0, len(pending), BATCH_CHUNK_SIZE):
+            chunk = pending[start:start + BATCH_CHUNK_SIZE]
+            scored = self._score_batch([user_input for _, user_input in chunk])
+            for (i, _), result in zip(chunk, scored):
+                results[i] = result
+    
+    def _get_corpus_matrix(self) -> Tuple[Any, Any, Dict[str, int]]:
+        """Build (or reuse) the binary conversation x token matrix"""
+        if self._corpus_matrix is None:
+            vocabulary = {token: col for col, token in enumerate(self._token_index)}
+            indptr = [0]
+            indices: List[int] = []
+            for entry in self._conversations:
+                # Tombstoned conversations become empty rows
+                if entry:
+                    indices.extend(vocabulary[token] for token in entry[0])
+                indptr.append(len(indices))
+            
+            matrix = sparse.csr_matrix(
+                (np.ones(len(indices)), np.array(indices, dtype=np.int64), np.array(indptr)),
+                shape=(len(self._conversations), len(vocabulary))
+            )
+            sizes = np.diff(matrix.indptr).astype(np.float64)
+            self._corpus_matrix = (matrix.T.tocsr(), sizes, vocabulary)
         
-        # If no good match found in JSON, search Google
-        if not json_response or json_response == "":
-            return self._search_google(user_input)
+        return self._corpus_matrix
+    
+    def _score_batch(self, inputs: List[str]) -> List[Tuple[str, float]]:
+        """Vectorized equivalent of _best_match for a chunk of inputs"""
+        if not self._conversations:
+            return [("", 0.0)] * len(inputs)
+        
+        corpus_t, conv_sizes, vocabulary = self._get_corpus_matrix()
+        
+        rows: List[int] = []
+        cols: List[int] = []
+        counts: List[int] = []
+        input_sizes = np.zeros(len(inputs))
+        for row, user_input in enumerate(inputs):
+            token_counts = Counter(tokenize(user_input))
+            input_sizes[row] = len(token_counts)
+            for token, count in token_counts.items():
+                col = vocabulary.get(token)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    counts.append(count)
+        
+        # Pack intersection size and exact-word count into one product:
+        # each shared token contributes scale + (its count in the query)
+        counts_array = np.array(counts, dtype=np.float64)
+        scale = float(counts_array.sum() + 1) if counts else 1.0
+        query = sparse.csr_matrix(
+            (scale + counts_array, (rows, cols)),
+            shape=(len(inputs), len(vocabulary))
+        )
+        product = (query @ corpus_t).tocsr()
+        
+        intersection = np.floor(product.data / scale)
+        exact_matches = product.data - intersection * scale
+        
+        row_lengths = np.diff(product.indptr)
+        row_ids = np.repeat(np.arange(len(inputs)), row_lengths)
+        union = input_sizes[row_ids] + conv_sizes[product.indices] - intersection
+        scores = intersection / union + exact_matches * WORD_MATCH_BONUS
+        
+        results: List[Tuple[str, float]] = [("", 0.0)] * len(inputs)
+        matched = np.flatnonzero(row_lengths)
+        if not len(matched):
+            return results
+        
+        # Best score per row, then the lowest conversation id reaching it so
+        # ties resolve in corpus order like the scalar scan
+        starts = product.indptr[matched]
+        best_scores = np.maximum.reduceat(scores, starts)
+        at_best = scores == np.repeat(best_scores, row_lengths[matched])
+        conv_ids = np.where(at_best, product.indices, len(self._conversations))
+        best_ids = np.minimum.reduceat(conv_ids, starts)
         
-        return json_response
+        for row, conv_id, best_score in zip(matched.tolist(), best_ids.tolist(), best_scores.tolist()):
+            if best_score > SIMILARITY_THRESHOLD:
+                results[row] = (self._conversations[conv_id][1], best_score)
+            else:
+                results[row] = ("", best_score)
+        
+        return results
     
     def _find_similar_response(self, user_input: str) -> str:
-        """Find most similar response using cosine similarity and TF-IDF"""
-        import re
-        from collections import Counter
+        """Find most similar response using Jaccard overlap over the token index"""
+        return self._best_match(user_input)[0]
+    
+    def _best_match(self, user_input: str) -> Tuple[str, float]:
+        """Return the best matching response and its similarity score"""
+        input_tokens = tokenize(user_input)
+        input_set = set(input_tokens)
+        
+        if not input_set or not self._conversations:
+            return "", 0.0
         
-        # Tokenize and clean input
-        input_tokens = re.findall(r'\b\w+\b', user_input.lower())
+        matcher = self._get_sharded_matcher()
+        if matcher:
+            try:
+                best_score, conv_id = matcher.best_match(input_tokens)
+            except (BrokenProcessPool, OSError) as e:
+                # A dead worker breaks the pool for good; score in this
+                # process from now on
+                self._disable_sharding(matcher, e)
+            else:
+                if best_score > SIMILARITY_THRESHOLD:
+                    return self._conversations[conv_id][1], best_score
+                return "", best_score
         
-        # Collect all conversations
-        all_conversations = []
-        for category_data in self.dataset.values():
-            if isinstance(category_data, dict) and "conversations" in category_data:
-                all_conversations.extend(category_data["conversations"])
+        # Occurrences of each query word, only needed when a word repeats
+        repeats = Counter(input_tokens) if len(input_tokens) != len(input_set) else None
         
-        if not all_conversations:
-            return ""
+        # Only conversations sharing at least one token can score above zero
+        candidates = set()
+        for token in input_set:
+            candidates.update(self._token_index.get(token, ()))
         
         # Calculate similarity scores
         best_match = None
         best_score = 0
         
-        for conv in all_conversations:
-            user_text = conv.get("user", "").lower()
-            response_text = conv.get("bot", "")
-            
-            if not user_text or not response_text:
-                continue
-            
-            # Simple word overlap similarity
-            conv_tokens = re.findall(r'\b\w+\b', user_text)
-            
-            # Calculate Jaccard similarity
-            input_set = set(input_tokens)
-            conv_set = set(conv_tokens)
-            
-            if not input_set or not conv_set:
-                continue
-            
-            intersection = len(input_set.intersection(conv_set))
-            union = len(input_set.union(conv_set))
+        # Visit candidates in corpus order so ties resolve as a full scan would
+        for conv_id in sorted(candidates):
+            conv_tokens, response_text = self._conversations[conv_id]
             
-            if union > 0:
-                similarity = intersection / union
-            else:
-                similarity = 0
+            # Calculate Jaccard similarity (prompt tokens are distinct)
+            shared = input_set.intersection(conv_tokens)
+            intersection = len(shared)
+            union = len(input_set) + len(conv_tokens) - intersection
+            similarity = intersection / union
             
-            # Bonus for exact word matches
-            exact_matches = sum(1 for word in input_tokens if word in conv_tokens)
-            similarity += exact_matches * 0.1
+            # Bonus for exact word matches, counting repeated query words
+            exact_matches = intersection if repeats is None else sum(repeats[word] for word in shared)
+            similarity += exact_matches * WORD_MATCH_BONUS
             
             if similarity > best_score:
                 best_score = similarity
                 best_match = response_text
         
         # Return response if similarity is above threshold
-        if best_score > 0.3:  # Adjust threshold as needed
-            return best_match
+        if best_score > SIMILARITY_THRESHOLD:
+            return best_match, best_score
         
-        return ""
+        return "", float(best_score)
+    
+    def _typo_match(self, user_input: str) -> Tuple[str, float]:
+        """_best_match after replacing unknown words with their closest
+        indexed spelling; ("", 0.0) when no word could be corrected
+        """
+        corrected = self._correct_typos(user_input)
+        if corrected is None:
+            return "", 0.0
+        return self._best_match(corrected)
+    
+    def _correct_typos(self, user_input: str, corrections: Optional[Dict[str, Optional[str]]] = None) -> Optional[str]:
+        """Return user_input with unknown words respelled, or None if no
+        word could be corrected
+        
+        corrections memoizes the replacement (or None) per word, so a batch
+        looks each distinct word up once.
+        """
+        typo_config = self.config.get("typo_correction", {})
+        if not typo_config.get("enabled", True):
+            return None
+        
+        words = tokenize(user_input)
+        unknown = [
+            i for i, word in enumerate(words)
+            if len(word) >= TYPO_MIN_TOKEN and word not in self._token_index
+        ]
+        if not unknown or not self._token_index:
+            return None
+        
+        if self._typo_index is None:
+            self._typo_index = TypoIndex({token: len(ids) for token, ids in self._token_index.items()})
+        max_distance = int(typo_config.get("max_distance", 2))
+        
+        corrected = False
+        for i in unknown:
+            word = words[i]
+            if corrections is not None and word in corrections:
+                replacement = corrections[word]
+            else:
+                replacement = self._typo_index.correct(
+                    word, max_distance if len(word) >= TYPO_LONG_TOKEN else min(max_distance, 1)
+                )
+                if corrections is not None:
+                    corrections[word] = replacement
+            if replacement:
+                words[i] = replacement
+                corrected = True
+        
+        if not corrected:
+            return None
+        return " ".join(words)
+    
+    def _get_sharded_matcher(self) -> Optional[ShardedMatcher]:
+        """Return the process-pool matcher if sharding applies to this corpus"""
+        sharding_config = self.config.get("sharding", {})
+        min_conversations = int(sharding_config.get("min_conversations", SHARDING_MIN_CONVERSATIONS))
+        if (not sharding_config.get("enabled", False) or self._sharding_failed
+                or len(self._conversations) < min_conversations):
+            return None
+        
+        with self._matcher_lock:
+            if self._sharded_matcher is None and not self._sharding_failed:
+                if not load_vector_modules():
+                    logger.warning("Sharded matching requires numpy; using a single process")
+                    self._sharding_failed = True
+                    return None
+                matcher = None
+                try:
+                    matcher = ShardedMatcher(int(sharding_config.get("workers", 0)))
+                    matcher.load(self._conversations, self._token_index)
+                except Exception as e:
+                    logger.error(f"Could not start sharded matching: {e}")
+                    if matcher:
+                        matcher.close()
+                    self._sharding_failed = True
+                    return None
+                self._sharded_matcher = matcher
+                logger.info(f"Sharded matching across {matcher.workers} worker processes")
+        return self._sharded_matcher
+    
+    def _reload_sharded_matcher(self) -> None:
+        """Publish the current tables to the worker pool"""
+        matcher = self._sharded_matcher
+        try:
+            matcher.load(self._conversations, self._token_index)
+        except (BrokenProcessPool, OSError) as e:
+            self._disable_sharding(matcher, e)
+    
+    def _disable_sharding(self, matcher: ShardedMatcher, error: Exception) -> None:
+        """Shut down a failed worker pool and fall back to a single process"""
+        with self._matcher_lock:
+            if self._sharded_matcher is not matcher:
+                return
+            self._sharded_matcher = None
+            self._sharding_failed = True
+        logger.error(f"Sharded matching failed, using a single process: {error}")
+        try:
+            matcher.close()
+        except Exception as e:
+            logger.debug(f"Error closing sharded matcher: {e}")
     
     def _handle_natural_language(self, user_input: str) -> str:
         """No longer needed - responses come only from JSON"""
@@ -365,6 +2988,15 @@ class Jarvis:
     def _exit_handler(self) -> str:
         """Handle exit commands"""
         self.running = False
+        self.stop_watching()
+        self._metrics_stop.set()
+        if self._sharded_matcher:
+            self._sharded_matcher.close()
+            self._sharded_matcher = None
+        if self.audio_capture:
+            self.audio_capture.stop()
+        if self._speculation_executor:
+            self._speculation_executor.shutdown(wait=False, cancel_futures=True)
         if self.voice_thread and self.voice_thread.is_alive():
             self.voice_thread.join(timeout=1)
         return self._get_category_response("farewell")
@@ -376,7 +3008,8 @@ class Jarvis:
         self._save_config()
         
         if enabled:
-            self._initialize_speech()
+            # Re-initialize on the next speak/listen
+            self._speech_ready = False
         
         return f"Voice {'enabled' if enabled else 'disabled'}."
     
@@ -392,8 +3025,7 @@ class Jarvis:
         
         for lang_name, lang_code in languages.items():
             if lang_name in command:
-                if lang_code in self.dataset:
-                    self.config["language"] = lang_code
+                if self.select_language(lang_code):
                     self._save_config()
                     return self._get_category_response("greetings")
                 else:
@@ -462,13 +3094,10 @@ class Jarvis:
         return ""
     
     def _save_config(self) -> None:
-        """Save configuration with error handling"""
-        try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=2)
-            logger.info("Configuration saved")
-        except Exception as e:
-            logger.error(f"Error saving config: {e}")
+        """Persist runtime settings (never the dataset) to the settings file"""
+        self.settings_store.save({
+            key: self.config[key] for key in PERSISTED_SETTINGS if key in self.config
+        })
     
     def run(self, mode: str = "interactive") -> None:
         """Main execution loop with multiple modes"""
@@ -492,6 +3121,10 @@ class Jarvis:
             self.speak("I've encountered a serious error. Please restart me.", priority=1)
         finally:
             self.running = False
+            self.settings_store.flush()
+            if self.speech_queue:
+                # Let the last words (e.g. the farewell) finish playing
+                self.speech_queue.shutdown(timeout=5)
     
     def _interactive_mode(self) -> None:
         """Text-based interactive mode"""
@@ -530,6 +3163,12 @@ class Jarvis:
                 break
 
 if __name__ == "__main__":
+    if len(os.sys.argv) > 1 and os.sys.argv[1].lower() == "compile":
+        # python jarvis.py compile [data_file]
+        data_file = os.sys.argv[2] if len(os.sys.argv) > 2 else "jarvis_data.json"
+        print(f"Snapshot written to {compile_snapshot(data_file)}")
+        os.sys.exit(0)
+    
     try:
         assistant = Jarvis()
         
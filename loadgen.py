@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""Load generator for session_server.py
+
+Usage:
+    python loadgen.py [--sessions 1000] [--messages 5] [--port 8001] [--start]
+
+Opens --sessions concurrent sessions, each with its own event stream and
+message connection, waits until all are connected, then has every session
+send --messages messages one after another. Latency is measured from
+sending a message to receiving its reply event. With --start a server is
+launched on --port for the run. Prints p50/p90/p99 latency and throughput
+as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Exact hits, near misses, typos and misses
+DEFAULT_QUERIES = [
+    "hello",
+    "what is ai",
+    "tell me a joke",
+    "who are you",
+    "waht is artifical intelligence",
+    "can you recommend a good movie",
+    "what is the meaning of life and everything",
+    "qwerty zxcvb",
+]
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client over asyncio streams"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def send(self, method, path, payload=None):
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b""
+        self.writer.write((
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        ).encode('latin-1') + body)
+        await self.writer.drain()
+        status, headers = await self.read_head()
+        length = int(headers.get('content-length', 0))
+        data = await self.reader.readexactly(length) if length else b""
+        return status, json.loads(data) if data else None
+
+    async def read_head(self):
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return status, headers
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    def close(self):
+        self.writer.close()
+
+async def read_events(connection, waiting):
+    """Resolve waiting[message_id] with the arrival time of its reply"""
+    event = None
+    while True:
+        line = await connection.reader.readline()
+        if not line:
+            return
+        line = line.decode('utf-8').rstrip("\r\n")
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:") and event in ("reply", "error"):
+            payload = json.loads(line[5:])
+            future = waiting.pop(payload.get("message_id"), None)
+            if future and not future.done():
+                future.set_result((time.perf_counter(), event == "reply"))
+
+async def run_session(args, queries, index, connected, go, stats):
+    messages = Connection(args.host, args.port)
+    events = Connection(args.host, args.port)
+    reader_task = None
+    try:
+        # Spread connection setup over the ramp so the listen queue keeps up
+        await asyncio.sleep(args.ramp * index / args.sessions)
+        await messages.open()
+        status, session = await messages.send("POST", "/sessions", {"voice_enabled": False})
+        if status != 201:
+            raise RuntimeError(f"create session returned {status}")
+        session_id = session["session_id"]
+
+        await events.open()
+        events.writer.write(
+            f"GET /sessions/{session_id}/events HTTP/1.1\r\nHost: {args.host}\r\n\r\n".encode('latin-1')
+        )
+        await events.writer.drain()
+        status, _ = await events.read_head()
+        if status != 200:
+            raise RuntimeError(f"event stream returned {status}")
+        waiting = {}
+        reader_task = asyncio.create_task(read_events(events, waiting))
+    except Exception as e:
+        stats["setup_errors"] += 1
+        stats["last_error"] = repr(e)
+        connected()
+        return
+    connected()
+    await go.wait()
+
+    try:
+        for message in range(1, args.messages + 1):
+            text = queries[(index + message) % len(queries)]
+            future = waiting[message] = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            status, reply = await messages.send("POST", f"/sessions/{session_id}/messages", {"text": text})
+            if status != 202 or reply.get("message_id") != message:
+                raise RuntimeError(f"message returned {status}")
+            arrived, ok = await asyncio.wait_for(future, args.timeout)
+            if ok:
+                stats["latencies"].append(arrived - started)
+            else:
+                stats["errors"] += 1
+            if args.think:
+                await asyncio.sleep(args.think)
+        await messages.send("DELETE", f"/sessions/{session_id}")
+    except Exception as e:
+        stats["errors"] += 1
+        stats["last_error"] = repr(e)
+    finally:
+        if reader_task:
+            reader_task.cancel()
+        messages.close()
+        events.close()
+
+async def run(args, queries):
+    stats = {"latencies": [], "errors": 0, "setup_errors": 0, "last_error": None}
+    ready = asyncio.Event()
+    go = asyncio.Event()
+    pending = args.sessions
+
+    def connected():
+        nonlocal pending
+        pending -= 1
+        if not pending:
+            ready.set()
+
+    setup_started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(run_session(args, queries, i, connected, go, stats))
+        for i in range(args.sessions)
+    ]
+    await ready.wait()
+    setup_seconds = time.perf_counter() - setup_started
+
+    started = time.perf_counter()
+    go.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    return stats, setup_seconds, elapsed
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def wait_for_port(host, port, process, timeout=120):
+    import socket
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("session server exited during startup")
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("session server did not start")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=5, help="messages per session")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds between a reply and the next message")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions connect")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for a reply")
+    parser.add_argument("--queries", help="text file with one message per line")
+    parser.add_argument("--start", action="store_true", help="launch session_server.py for the run")
+    parser.add_argument("--workers", type=int, help="matching threads of the launched server")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    sys.path.insert(0, ROOT)
+    from session_server import raise_file_limit
+    raise_file_limit()
+
+    server = None
+    if args.start:
+        command = [sys.executable, os.path.join(ROOT, "session_server.py"), "--port", str(args.port)]
+        if args.workers:
+            command += ["--workers", str(args.workers)]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if server:
+            wait_for_port(args.host, args.port, server)
+        stats, setup_seconds, elapsed = asyncio.run(run(args, queries))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    latencies = sorted(stats["latencies"])
+    report = {
+        "sessions": args.sessions,
+        "messages_per_session": args.messages,
+        "replies": len(latencies),
+        "errors": stats["errors"],
+        "setup_errors": stats["setup_errors"],
+        "setup_seconds": round(setup_seconds, 3),
+        "seconds": round(elapsed, 3),
+        "replies_per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+            "p50": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            "p90": round(percentile(latencies, 0.90) * 1000, 2) if latencies else None,
+            "p99": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            "max": round(latencies[-1] * 1000, 2) if latencies else None,
+        },
+    }
+    if stats["last_error"]:
+        report["last_error"] = stats["last_error"]
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if stats["errors"] or stats["setup_errors"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,130 @@
+// Lookup index compiled by build_client.py; matches exactly like jarvis.py
+class LocalIndex {
+    static FORMAT = 1;
+
+    constructor(data) {
+        this.strings = data.strings;
+        this.prompts = data.prompts;
+        this.sizes = data.sizes;
+        this.responses = data.responses;
+        this.tokens = data.tokens;
+        this.threshold = data.threshold;
+        this.bonus = data.bonus;
+        // Posting lists arrive gap-encoded and are decoded on first use
+        this.postings = new Map();
+    }
+
+    static tokenize(text) {
+        // Same words as Python's \w+ on lower-cased text
+        return text.toLowerCase().match(/[\p{L}\p{N}_]+/gu) || [];
+    }
+
+    match(input) {
+        const prompt = input.toLowerCase().trim();
+        if (!prompt) return null;
+
+        if (Object.hasOwn(this.prompts, prompt)) {
+            const candidates = this.prompts[prompt];
+            return this.strings[candidates[Math.floor(Math.random() * candidates.length)]];
+        }
+        return this.bestMatch(prompt);
+    }
+
+    postingsFor(token) {
+        let ids = this.postings.get(token);
+        if (ids === undefined) {
+            const gaps = Object.hasOwn(this.tokens, token) ? this.tokens[token] : [];
+            ids = new Array(gaps.length);
+            let id = 0;
+            for (let i = 0; i < gaps.length; i++) {
+                id += gaps[i];
+                ids[i] = id;
+            }
+            this.postings.set(token, ids);
+        }
+        return ids;
+    }
+
+    bestMatch(prompt) {
+        const counts = new Map();
+        for (const token of LocalIndex.tokenize(prompt)) {
+            counts.set(token, (counts.get(token) || 0) + 1);
+        }
+        if (!counts.size) return null;
+
+        // Conversation id -> [shared words, query occurrences of them]
+        const shared = new Map();
+        for (const [token, count] of counts) {
+            for (const id of this.postingsFor(token)) {
+                const entry = shared.get(id);
+                if (entry) {
+                    entry[0] += 1;
+                    entry[1] += count;
+                } else {
+                    shared.set(id, [1, count]);
+                }
+            }
+        }
+
+        let best = -1;
+        let bestScore = 0;
+        for (const [id, [intersection, occurrences]] of shared) {
+            const score = intersection / (counts.size + this.sizes[id] - intersection) + occurrences * this.bonus;
+            // Ties go to the earliest conversation, as on the server
+            if (score > bestScore || (score === bestScore && id < best)) {
+                best = id;
+                bestScore = score;
+            }
+        }
+        return bestScore > this.threshold ? this.strings[this.responses[best]] : null;
+    }
+}
+
 class JarvisUI {
     constructor() {
         this.isListening = false;
         this.isVoiceEnabled = true;
-        this.dataset = null;
         this.recognition = null;
+        this.localIndex = null;
         this.initializeElements();
         this.bindEvents();
         this.setupAudioVisualizer();
-        this.loadDataset();
+        this.loadLocalIndex();
     }
 
-    async loadDataset() {
+    async loadLocalIndex() {
+        // The manifest is revalidated on every visit; the index it names is
+        // content-hashed and served from the browser cache after the first
         try {
-            const response = await fetch('jarvis_data.json');
-            this.dataset = await response.json();
-            console.log('Dataset loaded successfully');
+            const manifestResponse = await fetch('dist/manifest.json');
+            if (!manifestResponse.ok) return;
+            const manifest = await manifestResponse.json();
+            if (manifest.format !== LocalIndex.FORMAT) return;
+
+            const indexResponse = await fetch(new URL(manifest.index, manifestResponse.url));
+            if (!indexResponse.ok) return;
+            this.localIndex = new LocalIndex(await indexResponse.json());
         } catch (error) {
-            console.error('Error loading dataset:', error);
-            this.dataset = {};
+            console.error('Error loading local index:', error);
+        }
+    }
+
+    async queryServer(input) {
+        // Matching runs server-side against the indexed dataset
+        try {
+            const response = await fetch('/api/query', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ query: input })
+            });
+            if (!response.ok) {
+                return null;
+            }
+            const result = await response.json();
+            return result.matched ? result.response : null;
+        } catch (error) {
+            console.error('Error querying server:', error);
+            return null;
         }
     }
 
@@ -105,10 +212,6 @@ class JarvisUI {
     }
 
     async processCommand(userInput) {
-        if (!this.dataset) {
-            return "I'm still loading my knowledge base. Please try again in a moment.";
-        }
-
         const input = userInput.toLowerCase().trim();
         
         // Handle Quick Actions
@@ -133,20 +236,15 @@ class JarvisUI {
             return this.calculateMath(userInput);
         }
         
-        // Handle dataset conversations
-        for (const categoryData of Object.values(this.dataset)) {
-            if (categoryData.conversations) {
-                for (const conv of categoryData.conversations) {
-                    if (conv.user && conv.user.toLowerCase().trim() === input) {
-                        return conv.bot || "I understand, but I don't have a specific response for that.";
-                    }
-                }
-            }
+        // Handle dataset conversations, locally once the index has loaded;
+        // the server also corrects typos, so it still gets the misses
+        const localResponse = this.localIndex?.match(input);
+        if (localResponse) {
+            return localResponse;
         }
-
-        const fuzzyResponse = this.findFuzzyMatch(input);
-        if (fuzzyResponse) {
-            return fuzzyResponse;
+        const datasetResponse = await this.queryServer(input);
+        if (datasetResponse) {
+            return datasetResponse;
         }
 
         return this.getGenericResponse(input);
@@ -227,35 +325,6 @@ class JarvisUI {
         }
     }
 
-    findFuzzyMatch(userInput) {
-        let bestMatch = null;
-        let bestScore = 0;
-
-        for (const categoryData of Object.values(this.dataset)) {
-            if (categoryData.conversations) {
-                for (const conv of categoryData.conversations) {
-                    if (conv.user) {
-                        const score = this.calculateSimilarity(userInput, conv.user.toLowerCase());
-                        if (score > bestScore && score > 0.3) {
-                            bestScore = score;
-                            bestMatch = conv.bot;
-                        }
-                    }
-                }
-            }
-        }
-
-        return bestMatch;
-    }
-
-    calculateSimilarity(str1, str2) {
-        const set1 = new Set(str1.split(' '));
-        const set2 = new Set(str2.split(' '));
-        const intersection = new Set([...set1].filter(x => set2.has(x)));
-        const union = new Set([...set1, ...set2]);
-        return intersection.size / union.size;
-    }
-
     getGenericResponse(input) {
         const responses = [
             "That's an interesting question. Let me think about it.",
@@ -1,23 +1,469 @@
 #!/usr/bin/env python3
+import email.utils
+import gzip
+import hashlib
 import http.server
-import socketserver
+import json
 import os
+import re
 import webbrowser
 import threading
 import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+# Optional: brotli variants are offered only when the module is installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 PORT = 8000
+# Largest accepted /api/query request body
+MAX_QUERY_BYTES = 64 * 1024
+
+# Files worth compressing, and the smallest size worth the effort
+COMPRESSIBLE_EXTENSIONS = ('.html', '.js', '.css', '.json', '.svg', '.txt', '.md')
+MIN_COMPRESS_BYTES = 1024
+# The web UI's files, served precompressed from memory together with the
+# build output in CLIENT_DIR; everything else is streamed from disk
+UI_ASSETS = ('index.html', 'styles.css', 'script.js')
+# Larger files are streamed too, and the cache keeps at most this much
+# content across all encodings
+MAX_CACHED_ASSET_BYTES = 4 * 1024 * 1024
+ASSET_CACHE_BYTES = 32 * 1024 * 1024
+# Compressed copies that build_client.py writes next to its outputs, for
+# files served from disk
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+STREAM_CHUNK_BYTES = 64 * 1024
+
+# Cache-Control by extension: documents and data revalidate on every load
+# (cheap 304s via ETag), other assets are reused for an hour
+CACHE_POLICIES = {
+    '.html': 'no-cache',
+    '.json': 'no-cache',
+}
+DEFAULT_CACHE_POLICY = 'public, max-age=3600'
+# Build outputs named by their content hash never change, so browsers may
+# keep them for good
+HASHED_NAME_PATTERN = re.compile(r'\.[0-9a-f]{16}\.\w+$')
+IMMUTABLE_CACHE_POLICY = 'public, max-age=31536000, immutable'
+# Where build_client.py writes the web UI's lookup index, and the manifest
+# the UI fetches on every visit
+CLIENT_DIR = 'dist'
+CLIENT_MANIFEST_PATH = f'/{CLIENT_DIR}/manifest.json'
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Client-supplied X-Request-ID values that are echoed into logs
+REQUEST_ID_PATTERN = re.compile(r'[\w.-]{1,64}')
+
+# Shared text-only assistant used by /api/query, created by start_server
+assistant = None
+# The assistant's dataset_version the client index was last built for
+client_index_version = None
+client_index_lock = threading.Lock()
+
+class StaticAsset:
+    """A file's content, validators and precompressed variants"""
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.mtime = int(stat.st_mtime)
+        self.etag = '"%s"' % hashlib.sha1(content).hexdigest()[:20]
+        self.variants = {'identity': content}
+
+        if path.endswith(COMPRESSIBLE_EXTENSIONS) and len(content) >= MIN_COMPRESS_BYTES:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < len(content):
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                if len(compressed) < len(content):
+                    self.variants['br'] = compressed
+        self.size = sum(len(body) for body in self.variants.values())
+
+    def variant_etag(self, encoding):
+        """Each encoding is a different representation with its own ETag"""
+        if encoding == 'identity':
+            return self.etag
+        return self.etag[:-1] + '-' + encoding + '"'
+
+    def length(self, encoding):
+        return len(self.variants[encoding])
+
+    def write(self, wfile, encoding, start, end):
+        wfile.write(self.variants[encoding][start:end + 1])
+
+class StreamedAsset:
+    """A file served from disk in chunks instead of from memory
+
+    The ETag comes from the file's mtime and size, so no request reads the
+    whole file. variants maps encodings to files: the file itself and any
+    precompressed copy at least as new as it.
+    """
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        self.signature = (stat.st_mtime_ns, stat.st_size)
+        self.last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        self.mtime = int(stat.st_mtime)
+        self.etag = '"%x-%x"' % self.signature
+        self.variants = {'identity': path}
+        self.sizes = {'identity': stat.st_size}
+
+        for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+            try:
+                compressed = os.stat(path + suffix)
+            except OSError:
+                continue
+            # An older copy belongs to a previous version of the file
+            if compressed.st_mtime_ns >= stat.st_mtime_ns:
+                self.variants[encoding] = path + suffix
+                self.sizes[encoding] = compressed.st_size
+
+    variant_etag = StaticAsset.variant_etag
+
+    def length(self, encoding):
+        return self.sizes[encoding]
+
+    def write(self, wfile, encoding, start, end):
+        remaining = end - start + 1
+        with open(self.variants[encoding], 'rb') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(STREAM_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                wfile.write(chunk)
+                remaining -= len(chunk)
+
+class AssetCache:
+    """Precompressed static files, refreshed when they change on disk
+
+    Holds at most max_bytes across all encodings, dropping the least
+    recently served file first. get() returns None for files above
+    MAX_CACHED_ASSET_BYTES, which the handler streams instead.
+    """
+
+    def __init__(self, max_bytes=ASSET_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._assets = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size > MAX_CACHED_ASSET_BYTES:
+            return None
+
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is not None and asset.signature == (stat.st_mtime_ns, stat.st_size):
+                self._assets.move_to_end(path)
+                return asset
+
+        asset = StaticAsset(path)
+        with self._lock:
+            previous = self._assets.pop(path, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._assets[path] = asset
+            self._bytes += asset.size
+            while self._bytes > self.max_bytes and len(self._assets) > 1:
+                _, evicted = self._assets.popitem(last=False)
+                self._bytes -= evicted.size
+        return asset
+
+    def preload(self, paths):
+        """Compress the given files ahead of the first request"""
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            asset = self.get(path)
+            if asset is None:
+                print(f"Streaming {os.path.basename(path)} (too large to cache)")
+                continue
+            sizes = ", ".join(f"{enc}={len(body)}" for enc, body in asset.variants.items())
+            print(f"Cached {os.path.basename(path)} ({sizes})")
+
+asset_cache = AssetCache()
+
+def ui_asset_paths(root):
+    """The files under root that are served from the asset cache"""
+    paths = [os.path.join(root, name) for name in UI_ASSETS]
+    client_dir = os.path.join(root, CLIENT_DIR)
+    if os.path.isdir(client_dir):
+        paths += [os.path.join(client_dir, name) for name in sorted(os.listdir(client_dir))
+                  if not name.endswith(tuple(PRECOMPRESSED_SUFFIXES.values()))]
+    return paths
+
+def is_ui_asset(root, path):
+    relative = os.path.relpath(path, root)
+    return relative in UI_ASSETS or os.path.dirname(relative) == CLIENT_DIR
+
+def cache_policy(path):
+    if HASHED_NAME_PATTERN.search(path):
+        return IMMUTABLE_CACHE_POLICY
+    return CACHE_POLICIES.get(os.path.splitext(path)[1], DEFAULT_CACHE_POLICY)
+
+def choose_encoding(accept_encoding, available):
+    """Pick the smallest available encoding the client accepts"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return 'identity'
 
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Request-ID')
+        self.send_header('Access-Control-Expose-Headers', 'X-Request-ID')
         super().end_headers()
 
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/api/query':
+            query = parse_qs(url.query).get('q', [''])[0]
+            self.handle_query(query)
+        elif url.path == '/metrics':
+            self.send_metrics()
+        else:
+            if url.path == CLIENT_MANIFEST_PATH:
+                refresh_client_index()
+            if not self.send_asset():
+                super().do_GET()
+
+    def do_HEAD(self):
+        if not self.send_asset(head_only=True):
+            super().do_HEAD()
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/api/query':
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length < 0:
+                # rfile.read(-1) would wait for the client to close the connection
+                self.send_json(400, {"error": "Invalid Content-Length"})
+                return
+            if length > MAX_QUERY_BYTES:
+                self.send_json(413, {"error": "Request body too large"})
+                return
+            body = json.loads(self.rfile.read(length) or b'{}')
+            query = body.get('query', '') if isinstance(body, dict) else ''
+        except (ValueError, json.JSONDecodeError):
+            self.send_json(400, {"error": "Expected a JSON body like {\"query\": \"...\"}"})
+            return
+
+        self.handle_query(query)
+
+    def handle_query(self, query):
+        """Answer a query from the shared assistant's dataset"""
+        if not isinstance(query, str) or not query.strip():
+            self.send_json(400, {"error": "Missing query"})
+            return
+        if assistant is None:
+            self.send_json(503, {"error": "Assistant is not available"})
+            return
+
+        # Honour a caller's request id so its logs can be correlated
+        request_id = self.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = None
+        with assistant.request(request_id) as request_id:
+            response, score = assistant.match(query)
+        self.send_json(200, {
+            "query": query,
+            "response": response,
+            "score": round(score, 4),
+            "matched": bool(response)
+        }, headers={'X-Request-ID': request_id})
+
+    def send_metrics(self):
+        """Expose the assistant's metrics in Prometheus text format"""
+        if assistant is None or not assistant.metrics.enabled:
+            self.send_json(503, {"error": "Metrics are not available"})
+            return
+
+        body = assistant.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_asset(self, head_only=False):
+        """Serve a file, UI files from the asset cache and others from disk;
+        False to let the base class redirect, list or 404
+        """
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            if not urlparse(self.path).path.endswith('/'):
+                return False
+            path = os.path.join(path, 'index.html')
+        if not os.path.isfile(path):
+            return False
+
+        asset = asset_cache.get(path) if is_ui_asset(self.directory, path) else None
+        if asset is None:
+            try:
+                asset = StreamedAsset(path)
+            except OSError:
+                return False
+
+        encoding = choose_encoding(self.headers.get('Accept-Encoding', ''), asset.variants)
+        etag = asset.variant_etag(encoding)
+        size = asset.length(encoding)
+
+        if self.is_not_modified(asset, etag):
+            self.send_response(304)
+            self.send_validators(path, asset, etag)
+            self.end_headers()
+            return True
+
+        # Byte ranges apply to the unencoded file only; malformed ones are ignored
+        status, start, end = 200, 0, size - 1
+        range_match = RANGE_PATTERN.match(self.headers.get('Range', '').strip())
+        if range_match and encoding == 'identity' and self.headers.get('If-Range', etag) == etag:
+            byte_range = self.resolve_range(range_match, size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return True
+            status, (start, end) = 206, byte_range
+
+        self.send_response(status)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Length', str(end - start + 1))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_validators(path, asset, etag)
+        self.end_headers()
+        if not head_only:
+            asset.write(self.wfile, encoding, start, end)
+        return True
+
+    def is_not_modified(self, asset, etag):
+        """Evaluate If-None-Match, falling back to If-Modified-Since"""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or asset.etag in tags
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return asset.mtime <= since
+        return False
+
+    def send_validators(self, path, asset, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', cache_policy(path))
+        self.send_header('Vary', 'Accept-Encoding')
+
+    @staticmethod
+    def resolve_range(range_match, size):
+        """Return (start, end) for a bytes range, or None if unsatisfiable"""
+        first, last = range_match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            # Suffix range: the final N bytes
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            return None
+        if start > end or start >= size:
+            return None
+        return start, end
+
+def create_assistant():
+    """Create and warm the shared assistant; None if it cannot be loaded"""
+    try:
+        from jarvis import Jarvis
+        return Jarvis.for_server()
+    except Exception as e:
+        print(f"Query API disabled: {e}")
+        return None
+
+def build_client_index():
+    """Recompile the web UI's lookup index if the dataset changed"""
+    global client_index_version
+    with client_index_lock:
+        version = assistant.dataset_version if assistant else None
+        try:
+            from build_client import ensure_built
+            data_file = assistant.config.get("data_file", "jarvis_data.json") if assistant else "jarvis_data.json"
+            manifest = ensure_built(data_file, CLIENT_DIR)
+            client_index_version = version
+            print(f"Client index {manifest['index']} ({manifest['bytes']} bytes)")
+        except Exception as e:
+            # The UI falls back to /api/query for every message
+            print(f"Client index unavailable: {e}")
+
+def refresh_client_index():
+    """Rebuild the client index once the assistant has hot-reloaded its data,
+    so the UI never answers from an older dataset than the server
+    """
+    if assistant is not None and assistant.dataset_version != client_index_version:
+        build_client_index()
+
 def start_server():
+    global assistant
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    with socketserver.TCPServer(("", PORT), MyHTTPRequestHandler) as httpd:
+    assistant = create_assistant()
+    build_client_index()
+    asset_cache.preload(ui_asset_paths(os.getcwd()))
+    # One thread per connection so slow clients don't block each other
+    with http.server.ThreadingHTTPServer(("", PORT), MyHTTPRequestHandler) as httpd:
         print(f"Server running at http://localhost:{PORT}")
         print("Open your browser to http://localhost:8000")
         httpd.serve_forever()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Asyncio conversation server: many sessions, one shared knowledge base
+
+Usage:
+    python session_server.py [--port 8001] [--config jarvis_data.json] [--workers 4]
+
+Each session keeps its own language, voice setting and history, separate
+from the assistant's global configuration. Replies are delivered as
+Server-Sent Events:
+
+    POST   /sessions                {"language": "en", "voice_enabled": true}
+    GET    /sessions/<id>           settings and history
+    POST   /sessions/<id>/settings  {"language": "hi", "voice_enabled": false}
+    POST   /sessions/<id>/messages  {"text": "hello"} -> 202 {"message_id": 1}
+    GET    /sessions/<id>/events    text/event-stream of "reply" events
+    DELETE /sessions/<id>
+
+All sessions of a language share one read-only Jarvis instance, created
+the first time a session selects the language. Matching runs on a thread
+pool so one slow query never holds up the event loop. Only the standard
+library is needed.
+"""
+import argparse
+import asyncio
+import collections
+import http
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+PORT = 8001
+# Pending connections the listening socket queues; load tests open
+# thousands at once
+LISTEN_BACKLOG = 4096
+MAX_BODY_BYTES = 64 * 1024
+MAX_HEADER_LINES = 100
+MAX_SESSIONS = 10000
+# Messages and replies kept per session
+SESSION_HISTORY = 50
+# Sessions without requests or an open event stream for this long expire
+SESSION_IDLE_SECONDS = 1800
+# Comment lines sent on idle event streams so proxies keep them open
+HEARTBEAT_SECONDS = 15
+# Events held for a session whose stream is not connected; oldest dropped
+EVENT_BACKLOG = 100
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+Request = collections.namedtuple("Request", "method path headers body keep_alive")
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class Session:
+    """Conversation state owned by one client"""
+
+    def __init__(self, language, voice_enabled):
+        self.id = uuid.uuid4().hex
+        self.language = language
+        self.voice_enabled = voice_enabled
+        self.history = collections.deque(maxlen=SESSION_HISTORY)
+        self.events = asyncio.Queue(EVENT_BACKLOG)
+        # Replies are produced one at a time, in message order
+        self.lock = asyncio.Lock()
+        self.messages = 0
+        self.listeners = 0
+        self.last_seen = time.monotonic()
+
+    def publish(self, event, payload):
+        if self.events.full():
+            self.events.get_nowait()
+        self.events.put_nowait((event, json.dumps(payload)))
+
+    def state(self):
+        return {
+            "session_id": self.id,
+            "language": self.language,
+            "voice_enabled": self.voice_enabled,
+            "history": list(self.history),
+        }
+
+def match(assistant, text, request_id):
+    """Runs on the executor; tags the assistant's logs with the request id"""
+    with assistant.request(request_id):
+        return assistant.match(text)
+
+async def read_request(reader):
+    """Parse one HTTP/1.x request, or return None when the client is done"""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode('latin-1').partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HttpError(400, "Too many headers")
+
+    if 'transfer-encoding' in headers:
+        raise HttpError(400, "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "Request body too large")
+    body = await reader.readexactly(length) if length > 0 else b""
+
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+    return Request(method.upper(), urlsplit(target).path, headers, body, keep_alive)
+
+def parse_json(body):
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        payload = None
+    if not isinstance(payload, dict):
+        raise HttpError(400, "Expected a JSON object")
+    return payload
+
+def response_head(status, headers):
+    lines = [f"HTTP/1.1 {status} {http.HTTPStatus(status).phrase}"]
+    lines.extend(f"{name}: {value}" for name, value in {**CORS_HEADERS, **headers}.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+async def send_json(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(response_head(status, {
+        'Content-Type': 'application/json; charset=utf-8',
+        'Content-Length': str(len(body)),
+        'Cache-Control': 'no-store',
+        'Connection': 'keep-alive' if keep_alive else 'close',
+    }) + body)
+    await writer.drain()
+
+class SessionServer:
+    def __init__(self, config_file="jarvis_data.json", workers=4):
+        self.config_file = config_file
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="session-match")
+        self.sessions = {}
+        # One Jarvis per language, created by the first session using it
+        self.assistants = {}
+        self.default_language = None
+        self._assistant_locks = {}
+        self._tasks = set()
+
+    def _create_assistant(self, language=None):
+        """Build a text-only assistant; runs on the executor"""
+        from jarvis import Jarvis
+        return Jarvis.for_server(self.config_file, language)
+
+    async def start(self, host="", port=PORT):
+        loop = asyncio.get_running_loop()
+        primary = await loop.run_in_executor(self.executor, self._create_assistant)
+        self.default_language = primary.config.get("language", "en")
+        self.assistants[self.default_language] = primary
+        self._server = await asyncio.start_server(
+            self.handle_connection, host or None, port, backlog=LISTEN_BACKLOG
+        )
+        self._spawn(self._expire_sessions())
+        return self._server
+
+    def language_available(self, language):
+        return self.assistants[self.default_language]._language_data_file(language) is not None
+
+    async def get_assistant(self, language):
+        """The assistant serving a language, created on first use"""
+        assistant = self.assistants.get(language)
+        if assistant:
+            return assistant
+        lock = self._assistant_locks.setdefault(language, asyncio.Lock())
+        async with lock:
+            if language not in self.assistants:
+                loop = asyncio.get_running_loop()
+                self.assistants[language] = await loop.run_in_executor(
+                    self.executor, self._create_assistant, language
+                )
+        return self.assistants[language]
+
+    def _spawn(self, coroutine):
+        # The loop only keeps weak references to tasks
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    keep_alive = await self.dispatch(request, writer)
+                except HttpError as e:
+                    await send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Error handling connection: {e}")
+        finally:
+            writer.close()
+
+    async def dispatch(self, request, writer):
+        """Answer one request; returns whether the connection stays open"""
+        if request.method == 'OPTIONS':
+            writer.write(response_head(204, {'Content-Length': '0'}))
+            await writer.drain()
+            return request.keep_alive
+
+        parts = [part for part in request.path.split('/') if part]
+        if not parts or parts[0] != 'sessions' or len(parts) > 3:
+            raise HttpError(404, "Not found")
+
+        if len(parts) == 1:
+            if request.method != 'POST':
+                raise HttpError(405, "Method not allowed")
+            status, payload = self.create_session(parse_json(request.body))
+            await send_json(writer, status, payload, request.keep_alive)
+            return request.keep_alive
+
+        session = self.sessions.get(parts[1])
+        if session is None:
+            raise HttpError(404, "Unknown session")
+        session.last_seen = time.monotonic()
+        action = parts[2] if len(parts) == 3 else None
+
+        if action is None and request.method == 'GET':
+            status, payload = 200, session.state()
+        elif action is None and request.method == 'DELETE':
+            self.close_session(session)
+            status, payload = 200, {"session_id": session.id, "closed": True}
+        elif action == 'settings' and request.method == 'POST':
+            status, payload = self.update_settings(session, parse_json(request.body))
+        elif action == 'messages' and request.method == 'POST':
+            status, payload = self.post_message(session, parse_json(request.body))
+        elif action == 'events' and request.method == 'GET':
+            await self.stream_events(session, writer)
+            return False
+        else:
+            raise HttpError(405, "Method not allowed")
+
+        await send_json(writer, status, payload, request.keep_alive)
+        return request.keep_alive
+
+    def create_session(self, body):
+        if len(self.sessions) >= MAX_SESSIONS:
+            return 503, {"error": "Too many sessions"}
+        language = body.get('language') or self.default_language
+        if not self.language_available(language):
+            return 400, {"error": f"Language {language!r} is not available"}
+        session = Session(language, bool(body.get('voice_enabled', True)))
+        self.sessions[session.id] = session
+        return 201, session.state()
+
+    def update_settings(self, session, body):
+        language = body.get('language', session.language)
+        if not self.language_available(language):
+            return 400, {"error": f"Language {language!r} is not available"}
+        session.language = language
+        session.voice_enabled = bool(body.get('voice_enabled', session.voice_enabled))
+        return 200, session.state()
+
+    def post_message(self, session, body):
+        text = body.get('text')
+        if not isinstance(text, str) or not text.strip():
+            return 400, {"error": "Missing text"}
+        session.messages += 1
+        message_id = session.messages
+        session.history.append({"role": "user", "message_id": message_id, "text": text})
+        self._spawn(self._reply(session, message_id, text))
+        return 202, {"message_id": message_id}
+
+    async def _reply(self, session, message_id, text):
+        async with session.lock:
+            started = time.perf_counter()
+            try:
+                assistant = await self.get_assistant(session.language)
+                response, score = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, match, assistant, text, f"{session.id[:8]}-{message_id}"
+                )
+            except Exception as e:
+                logger.error(f"Error answering session {session.id}: {e}")
+                session.publish("error", {"message_id": message_id, "error": "Could not answer"})
+                return
+            session.history.append({"role": "assistant", "message_id": message_id, "text": response})
+            session.publish("reply", {
+                "message_id": message_id,
+                "text": response,
+                "score": round(score, 4),
+                "matched": bool(response),
+                "speak": session.voice_enabled,
+                "seconds": round(time.perf_counter() - started, 6),
+            })
+
+    async def stream_events(self, session, writer):
+        """Send the session's events until it closes or the client leaves"""
+        writer.write(response_head(200, {
+            'Content-Type': 'text/event-stream; charset=utf-8',
+            'Cache-Control': 'no-store',
+            'Connection': 'keep-alive',
+        }) + b": connected\n\n")
+        session.listeners += 1
+        try:
+            await writer.drain()
+            while session.id in self.sessions:
+                try:
+                    event, data = await asyncio.wait_for(session.events.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                else:
+                    writer.write(f"event: {event}\ndata: {data}\n\n".encode('utf-8'))
+                await writer.drain()
+                session.last_seen = time.monotonic()
+        finally:
+            session.listeners -= 1
+
+    def close_session(self, session):
+        if self.sessions.pop(session.id, None):
+            # Wakes the event stream, which then sees the session is gone
+            session.publish("closed", {"session_id": session.id})
+
+    async def _expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.monotonic() - SESSION_IDLE_SECONDS
+            for session in list(self.sessions.values()):
+                if not session.listeners and session.last_seen < cutoff:
+                    self.close_session(session)
+
+def raise_file_limit():
+    """Allow as many open sockets as the hard limit permits"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+async def serve(args):
+    server = SessionServer(args.config, args.workers)
+    listener = await server.start(args.host, args.port)
+    print(f"Session server running at http://localhost:{args.port}", flush=True)
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--config", default="jarvis_data.json")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="threads matching messages")
+    args = parser.parse_args()
+
+    args.config = os.path.abspath(args.config)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    raise_file_limit()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Tests for the response cache and its invalidation
+
+Usage:
+    python -m pytest -q test_cache.py
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jarvis import Jarvis, ResponseCache
+
+# No log output from the assistants under test
+logging.disable(logging.CRITICAL)
+
+CONVERSATIONS = [
+    {"user": "What is AI?", "bot": "Artificial intelligence."},
+    {"user": "What is AI?", "bot": "The study of thinking machines."},
+    {"user": "Tell me a joke", "bot": "Why did the robot cross the road?"},
+]
+
+def write_data_file(path, conversations, **settings):
+    data = {"ai": {"categories": ["AI"], "conversations": conversations}}
+    data.update({
+        "data_file": path,
+        "settings_file": os.path.join(os.path.dirname(path), "jarvis_settings.json"),
+        "voice_enabled": False,
+        "hot_reload": {"enabled": False},
+    })
+    data.update(settings)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+class ResponseCacheTest(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = ResponseCache(max_size=2)
+        cache.put("a", ["1"])
+        cache.put("b", ["2"])
+        # Reading a makes b the least recently used entry
+        self.assertEqual(cache.get("a"), ["1"])
+        cache.put("c", ["3"])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), ["1"])
+        self.assertEqual(cache.get("c"), ["3"])
+
+    def test_put_replaces_and_refreshes_an_entry(self):
+        cache = ResponseCache(max_size=2)
+        cache.put("a", ["1"])
+        cache.put("b", ["2"])
+        cache.put("a", ["1b"])
+        cache.put("c", ["3"])
+        self.assertEqual(cache.get("a"), ["1b"])
+        self.assertIsNone(cache.get("b"))
+
+    def test_entries_expire_after_ttl(self):
+        cache = ResponseCache(max_size=4, ttl=5)
+        with mock.patch("jarvis.time.monotonic", return_value=100.0):
+            cache.put("a", ["1"])
+        with mock.patch("jarvis.time.monotonic", return_value=104.9):
+            self.assertEqual(cache.get("a"), ["1"])
+        with mock.patch("jarvis.time.monotonic", return_value=105.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_zero_ttl_never_expires(self):
+        cache = ResponseCache(max_size=4, ttl=0)
+        with mock.patch("jarvis.time.monotonic", return_value=0.0):
+            cache.put("a", ["1"])
+        with mock.patch("jarvis.time.monotonic", return_value=10.0 ** 9):
+            self.assertEqual(cache.get("a"), ["1"])
+
+    def test_counts_hits_and_misses(self):
+        cache = ResponseCache(max_size=4)
+        cache.get("a")
+        cache.put("a", [])
+        # An empty candidate list is a cached miss, not a cache miss
+        self.assertEqual(cache.get("a"), [])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "size": 1, "max_size": 4})
+
+    def test_clear_keeps_counters(self):
+        cache = ResponseCache(max_size=4)
+        cache.put("a", ["1"])
+        cache.get("a")
+        cache.clear()
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "size": 0, "max_size": 4})
+
+class JarvisCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="jarvis-test-")
+        self.data_file = os.path.join(self.directory, "jarvis_data.json")
+        write_data_file(self.data_file, CONVERSATIONS)
+        self.jarvis = Jarvis(self.data_file)
+
+    def tearDown(self):
+        self.jarvis.stop_watching()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_repeated_input_is_served_from_the_cache(self):
+        answers = {self.jarvis.process_command("What is AI?") for _ in range(20)}
+        # Variants are still picked per call
+        self.assertEqual(answers, {"Artificial intelligence.", "The study of thinking machines."})
+        stats = self.jarvis.response_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["size"]), (19, 1, 1))
+
+    def test_misses_are_cached_but_still_searched(self):
+        with mock.patch.object(self.jarvis, "_search_google", return_value="searched") as search:
+            self.assertEqual(self.jarvis.process_command("qwxz zzkv"), "searched")
+            self.assertEqual(self.jarvis.process_command("qwxz zzkv"), "searched")
+        self.assertEqual(search.call_count, 2)
+        self.assertEqual(self.jarvis.response_cache.stats()["hits"], 1)
+
+    def test_rebuilding_the_index_invalidates_the_cache(self):
+        self.assertEqual(self.jarvis.process_command("tell me a joke"), "Why did the robot cross the road?")
+        version = self.jarvis.dataset_version
+
+        write_data_file(self.data_file, CONVERSATIONS[:2] + [{"user": "Tell me a joke", "bot": "Knock knock."}])
+        self.jarvis.dataset = self.jarvis._load_dataset()
+        self.jarvis._build_index()
+
+        self.assertGreater(self.jarvis.dataset_version, version)
+        self.assertEqual(self.jarvis.response_cache.stats()["size"], 0)
+        self.assertEqual(self.jarvis.process_command("tell me a joke"), "Knock knock.")
+
+    def test_reload_invalidates_the_cache(self):
+        self.assertEqual(self.jarvis.process_command("tell me a joke"), "Why did the robot cross the road?")
+        version = self.jarvis.dataset_version
+
+        write_data_file(self.data_file, CONVERSATIONS[:2] + [{"user": "Tell me a joke", "bot": "Knock knock."}])
+        self.assertTrue(self.jarvis.reload_dataset())
+
+        self.assertGreater(self.jarvis.dataset_version, version)
+        self.assertEqual(self.jarvis.response_cache.stats()["size"], 0)
+        self.assertEqual(self.jarvis.process_command("tell me a joke"), "Knock knock.")
+
+    def test_config_can_disable_the_cache(self):
+        for cache_config in ({"enabled": False}, {"max_size": 0}):
+            write_data_file(self.data_file, CONVERSATIONS, cache=cache_config)
+            assistant = Jarvis(self.data_file)
+            self.assertIsNone(assistant.response_cache, msg=cache_config)
+            self.assertEqual(assistant.process_command("tell me a joke"), "Why did the robot cross the road?")
+            assistant.stop_watching()
+
+    def test_config_sets_size_and_ttl(self):
+        write_data_file(self.data_file, CONVERSATIONS, cache={"max_size": 7, "ttl": 30})
+        assistant = Jarvis(self.data_file)
+        assistant.stop_watching()
+        self.assertEqual((assistant.response_cache.max_size, assistant.response_cache.ttl), (7, 30.0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""Equivalence checks for the optimized matching paths
+
+Usage:
+    python -m pytest -q test_matching.py
+    python test_matching.py
+
+Each fast path is compared against the straightforward one it replaces,
+on a corpus generated from jarvis_data.json. Checks whose optional
+dependency is missing are skipped.
+"""
+import io
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import jarvis
+from jarvis import Jarvis, JsonStream, TypoIndex, edit_distance, load_vector_modules
+
+# No log output from the assistants under test
+logging.disable(logging.CRITICAL)
+
+CORPUS_SIZE = 3000
+QUERY_COUNT = 600
+
+def load_base_conversations():
+    """(category, prompt, response) for every conversation in jarvis_data.json"""
+    with open(os.path.join(ROOT, "jarvis_data.json"), encoding='utf-8') as f:
+        data = json.load(f)
+    base = []
+    for category, value in data.items():
+        if isinstance(value, dict) and "conversations" in value:
+            for conv in value["conversations"]:
+                if conv.get("user") and conv.get("bot"):
+                    base.append((category, conv["user"], conv["bot"]))
+    return base
+
+def write_corpus(path, size, seed, **settings):
+    """Write a data file of `size` conversations scaled from the base set"""
+    base = load_base_conversations()
+    rng = random.Random(seed)
+    vocabulary = sorted({word for _, user, _ in base for word in user.lower().split()})
+    data = {}
+    for i in range(size):
+        category, user, bot = base[i % len(base)]
+        if i >= len(base):
+            # Later copies get extra words so prompts stay distinct
+            user = f"{user} {rng.choice(vocabulary)} {rng.choice(vocabulary)}"
+        data.setdefault(category, {"categories": [category], "conversations": []})
+        data[category]["conversations"].append({"user": user, "bot": bot})
+    data.update({
+        "data_file": path,
+        "settings_file": os.path.join(os.path.dirname(path), "jarvis_settings.json"),
+        "voice_enabled": False,
+        "hot_reload": {"enabled": False},
+    })
+    data.update(settings)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+def misspell(word, rng):
+    """Swap two neighbouring letters of longer words"""
+    if len(word) < 4:
+        return word
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def make_queries(prompts, vocabulary, count, seed):
+    """Exact prompts, near misses, misspellings, random words and misses"""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        words = rng.choice(prompts).split()
+        kind = i % 5
+        if kind == 1 and len(words) > 1:
+            words.pop(rng.randrange(len(words)))
+            words.append(rng.choice(vocabulary))
+        elif kind == 2:
+            words = [misspell(word, rng) for word in words]
+        elif kind == 3:
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 5))]
+        elif kind == 4:
+            words = ["qwxz", "zzkv"]
+        queries.append(" ".join(words))
+    return queries
+
+def read_value(stream):
+    """Decode the next value through members()/elements() only"""
+    token = stream.peek()
+    if token == "{":
+        return {key: read_value(stream) for key in stream.members()}
+    if token == "[":
+        return [read_value(stream) for _ in stream.elements()]
+    return stream.value()
+
+class CorpusTestCase(unittest.TestCase):
+    """Writes a generated corpus to a temporary directory"""
+
+    settings = {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.create_corpus()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.remove_corpus()
+
+    @classmethod
+    def create_corpus(cls):
+        cls.directory = tempfile.mkdtemp(prefix="jarvis-test-")
+        cls.data_file = os.path.join(cls.directory, "jarvis_data.json")
+        write_corpus(cls.data_file, CORPUS_SIZE, 7, **cls.settings)
+        cls.jarvis = Jarvis(cls.data_file)
+        prompts = list(cls.jarvis._exact_index)
+        vocabulary = sorted(cls.jarvis._token_index)
+        cls.queries = make_queries(prompts, vocabulary, QUERY_COUNT, 11)
+
+    @classmethod
+    def remove_corpus(cls):
+        cls.jarvis.stop_watching()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def lookup(self, assistant, query):
+        """(candidates, score) from an exact lookup, then a single scan of
+        the query as typed and of its typo-corrected spelling
+        """
+        query = query.lower().strip()
+        candidates = assistant._exact_index.get(query)
+        if candidates:
+            return list(candidates), 1.0
+        response, score = assistant._best_match(query)
+        corrected_response, corrected_score = assistant._typo_match(query)
+        if corrected_response and corrected_score > score:
+            response, score = corrected_response, corrected_score
+        return [response] if response else [], score
+
+    def assertSameMatch(self, expected, actual, query):
+        """actual is a (response, score) pair, expected (candidates, score)"""
+        candidates, score = expected
+        response, actual_score = actual
+        self.assertAlmostEqual(actual_score, score, places=9, msg=query)
+        if candidates:
+            self.assertIn(response, candidates, msg=query)
+        else:
+            self.assertEqual(response, "", msg=query)
+
+@unittest.skipUnless(load_vector_modules(), "process_commands needs numpy and scipy to vectorize")
+class BatchMatchTest(CorpusTestCase):
+
+    def test_batch_matches_scalar(self):
+        results = self.jarvis.process_commands(self.queries)
+        for query, result in zip(self.queries, results):
+            self.assertSameMatch(self.lookup(self.jarvis, query), result, query)
+
+    def test_batch_matches_scalar_without_typo_correction(self):
+        self.jarvis.config["typo_correction"]["enabled"] = False
+        try:
+            results = self.jarvis.process_commands(self.queries)
+            for query, result in zip(self.queries, results):
+                self.assertSameMatch(self.lookup(self.jarvis, query), result, query)
+        finally:
+            self.jarvis.config["typo_correction"]["enabled"] = True
+
+    def test_batch_spans_several_chunks(self):
+        queries = self.queries * (jarvis.BATCH_CHUNK_SIZE // len(self.queries) + 2)
+        results = self.jarvis.process_commands(queries)
+        self.assertEqual(len(results), len(queries))
+        for query, result in zip(queries, results):
+            self.assertSameMatch(self.lookup(self.jarvis, query), result, query)
+
+    def test_empty_inputs(self):
+        self.assertEqual(self.jarvis.process_commands(["", None, "   "]), [("", 0.0)] * 3)
+
+def edit_corpus(path, seed, remove=0.1, reword=0.1):
+    """Drop and reword a share of each category's conversations and append one"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    rng = random.Random(seed)
+    for category in data.values():
+        if not isinstance(category, dict) or "conversations" not in category:
+            continue
+        conversations = category["conversations"]
+        for conv in rng.sample(conversations, int(len(conversations) * remove)):
+            conversations.remove(conv)
+        for conv in rng.sample(conversations, int(len(conversations) * reword)):
+            conv["bot"] = conv["bot"] + " (updated)"
+        conversations.append({"user": f"added to {category['categories'][0]}", "bot": "new answer"})
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+class ReloadTest(CorpusTestCase):
+    """Each test edits the data file, so each gets its own corpus"""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.create_corpus()
+
+    def tearDown(self):
+        self.remove_corpus()
+
+    def assertMatchesRebuild(self, exact_responses):
+        """Compare the reloaded tables with an assistant built from scratch"""
+        rebuilt = Jarvis(self.data_file)
+        try:
+            self.assertEqual(
+                {prompt: sorted(responses) for prompt, responses in self.jarvis._exact_index.items() if responses},
+                {prompt: sorted(responses) for prompt, responses in rebuilt._exact_index.items()}
+            )
+            for query in self.queries + ["added to ai"]:
+                reloaded_candidates, reloaded_score = self.lookup(self.jarvis, query)
+                rebuilt_candidates, rebuilt_score = self.lookup(rebuilt, query)
+                self.assertAlmostEqual(reloaded_score, rebuilt_score, places=9, msg=query)
+                if exact_responses:
+                    self.assertEqual(sorted(reloaded_candidates), sorted(rebuilt_candidates), msg=query)
+                else:
+                    # Appended conversations get later ids, so equal scores
+                    # may resolve to a different, equally good response
+                    self.assertEqual(bool(reloaded_candidates), bool(rebuilt_candidates), msg=query)
+        finally:
+            rebuilt.stop_watching()
+
+    def test_incremental_reload_matches_rebuild(self):
+        edit_corpus(self.data_file, 3)
+        self.assertTrue(self.jarvis.reload_dataset())
+        self.assertGreater(self.jarvis._tombstones, 0)
+        self.assertMatchesRebuild(exact_responses=False)
+
+    def test_mostly_removed_dataset_is_rebuilt(self):
+        edit_corpus(self.data_file, 5, remove=0.7)
+        self.assertTrue(self.jarvis.reload_dataset())
+        # The rebuild drops the tombstones, so ids agree with a fresh index
+        self.assertEqual(self.jarvis._tombstones, 0)
+        self.assertMatchesRebuild(exact_responses=True)
+
+    def test_unchanged_file_is_not_applied(self):
+        version = self.jarvis.dataset_version
+        self.assertFalse(self.jarvis.reload_dataset())
+        self.assertEqual(self.jarvis.dataset_version, version)
+
+    def test_unreadable_file_keeps_the_dataset(self):
+        expected = [self.lookup(self.jarvis, query) for query in self.queries]
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            f.write('{"ai": {"conversations": [')
+        self.assertFalse(self.jarvis.reload_dataset())
+        self.assertEqual([self.lookup(self.jarvis, query) for query in self.queries], expected)
+
+    @unittest.skipUnless(load_vector_modules(), "process_commands needs numpy and scipy to vectorize")
+    def test_batch_after_reload_matches_scalar(self):
+        self.jarvis.process_commands(self.queries)
+        edit_corpus(self.data_file, 3)
+        self.assertTrue(self.jarvis.reload_dataset())
+        results = self.jarvis.process_commands(self.queries)
+        for query, result in zip(self.queries, results):
+            self.assertSameMatch(self.lookup(self.jarvis, query), result, query)
+
+@unittest.skipUnless(load_vector_modules(), "sharded matching needs numpy")
+class ShardedMatchTest(CorpusTestCase):
+
+    def test_sharded_matches_single_process(self):
+        inputs = [query.lower().strip() for query in self.queries]
+        expected = [self.jarvis._best_match(query) for query in inputs]
+        self.jarvis.config["sharding"].update({"enabled": True, "workers": 3, "min_conversations": 1})
+        try:
+            self.assertIsNotNone(self.jarvis._get_sharded_matcher())
+            for query, result in zip(inputs, expected):
+                self.assertEqual(self.jarvis._best_match(query), result, msg=query)
+        finally:
+            self.jarvis.config["sharding"]["enabled"] = False
+            if self.jarvis._sharded_matcher:
+                self.jarvis._sharded_matcher.close()
+                self.jarvis._sharded_matcher = None
+
+def reference_distance(a, b):
+    """Uncapped optimal string alignment distance, straight from the definition"""
+    d = [[i + j if not i or not j else 0 for j in range(len(b) + 1)] for i in range(len(a) + 1)]
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            d[i][j] = min(d[i - 1][j] + 1, d[i][j - 1] + 1, d[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                d[i][j] = min(d[i][j], d[i - 2][j - 2] + 1)
+    return d[len(a)][len(b)]
+
+class TypoIndexTest(unittest.TestCase):
+
+    def test_edit_distance_matches_reference(self):
+        rng = random.Random(5)
+        for _ in range(2000):
+            a = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+            b = "".join(rng.choice("abc") for _ in range(rng.randint(0, 7)))
+            limit = rng.randint(0, 3)
+            self.assertEqual(edit_distance(a, b, limit), min(reference_distance(a, b), limit + 1), msg=(a, b, limit))
+
+    def test_single_edits_match_brute_force(self):
+        rng = random.Random(9)
+        words = sorted({"".join(rng.choice("abcdef") for _ in range(rng.randint(3, 7))) for _ in range(200)})
+        frequencies = {word: i + 1 for i, word in enumerate(rng.sample(words, len(words)))}
+        index = TypoIndex(frequencies)
+        for _ in range(400):
+            query = misspell(rng.choice(words), rng) if rng.random() < 0.5 else "".join(
+                rng.choice("abcdef") for _ in range(rng.randint(3, 7)))
+            within = [(reference_distance(query, word), -frequencies[word], word) for word in words]
+            within = [entry for entry in within if entry[0] <= 1]
+            self.assertEqual(index.correct(query, 1), min(within)[2] if within else None, msg=query)
+
+    def test_corrects_common_typos(self):
+        index = TypoIndex({"jarvis": 3, "weather": 2, "what": 5})
+        self.assertEqual(index.correct("jarvs", 1), "jarvis")
+        self.assertEqual(index.correct("waht", 1), "what")
+        self.assertEqual(index.correct("wether", 2), "weather")
+
+    def test_ties_go_to_the_more_frequent_word(self):
+        self.assertEqual(TypoIndex({"cat": 1, "car": 9, "cap": 4}).correct("caz", 1), "car")
+
+    def test_nothing_within_range(self):
+        index = TypoIndex({"jarvis": 1})
+        self.assertIsNone(index.correct("javs", 1))
+        self.assertIsNone(index.correct("qwxz", 2))
+        # Shares a deletion with "jarvis" but is two edits away
+        self.assertIsNone(index.correct("arvisx", 1))
+
+class JsonStreamTest(unittest.TestCase):
+
+    DOCUMENT = json.dumps({
+        "ai": {
+            "categories": ["AI", "artificial intelligence"],
+            "conversations": [
+                {"user": "What is AI?", "bot": "Quote \" and backslash \\ and tab \t"},
+                {"user": "café ☃ \U0001f600", "bot": ""},
+            ],
+        },
+        "numbers": [0, -1, 2.5, 1e10, -3.25e-7, 12345678901234567890],
+        "literals": [True, False, None, [], {}, [[]], {"a": {}}],
+        "cache": {"enabled": False, "max_size": 1024, "ttl": 0.5},
+    }, indent=2, ensure_ascii=False)
+
+    def test_every_chunk_size_matches_json_loads(self):
+        expected = json.loads(self.DOCUMENT)
+        for chunk_size in range(1, len(self.DOCUMENT) + 2):
+            stream = JsonStream(io.StringIO(self.DOCUMENT), chunk_size=chunk_size)
+            self.assertEqual(read_value(stream), expected, msg=f"chunk_size={chunk_size}")
+            stream.end()
+
+    def test_value_matches_json_loads(self):
+        expected = json.loads(self.DOCUMENT)
+        for chunk_size in (1, 2, 3, 7, 64, 4096):
+            stream = JsonStream(io.StringIO(self.DOCUMENT), chunk_size=chunk_size)
+            self.assertEqual(stream.value(), expected, msg=f"chunk_size={chunk_size}")
+
+    def test_truncated_document_raises(self):
+        for chunk_size in (1, 5, 4096):
+            stream = JsonStream(io.StringIO(self.DOCUMENT[:-20]), chunk_size=chunk_size)
+            with self.assertRaises(json.JSONDecodeError):
+                read_value(stream)
+
+NODE_HARNESS = r"""
+const fs = require('fs');
+const [scriptFile, indexFile, queriesFile] = process.argv.slice(1);
+const source = fs.readFileSync(scriptFile, 'utf8');
+const LocalIndex = new Function(source.slice(0, source.indexOf('class JarvisUI')) + '\nreturn LocalIndex;')();
+const index = new LocalIndex(JSON.parse(fs.readFileSync(indexFile, 'utf8')));
+const queries = JSON.parse(fs.readFileSync(queriesFile, 'utf8'));
+process.stdout.write(JSON.stringify(queries.map(query => index.match(query))));
+"""
+
+@unittest.skipUnless(shutil.which("node"), "the client index check runs script.js under node")
+class ClientIndexTest(CorpusTestCase):
+
+    # The browser does not correct typos, it defers to the server instead
+    settings = {"typo_correction": {"enabled": False}}
+
+    def test_client_index_matches_server(self):
+        from build_client import build
+        out_dir = os.path.join(self.directory, "dist")
+        manifest = build(self.data_file, out_dir)
+        queries_file = os.path.join(self.directory, "queries.json")
+        with open(queries_file, 'w', encoding='utf-8') as f:
+            json.dump(self.queries, f)
+
+        output = subprocess.run(
+            ["node", "-e", NODE_HARNESS, os.path.join(ROOT, "script.js"),
+             os.path.join(out_dir, manifest["index"]), queries_file],
+            capture_output=True, check=True, text=True
+        ).stdout
+        for query, answer in zip(self.queries, json.loads(output)):
+            candidates, _ = self.lookup(self.jarvis, query)
+            if candidates:
+                self.assertIn(answer, candidates, msg=query)
+            else:
+                self.assertIsNone(answer, msg=query)
+
+if __name__ == "__main__":
+    unittest.main()
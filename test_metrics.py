@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Tests for request metrics and stage timings
+
+Usage:
+    python -m pytest -q test_metrics.py
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import jarvis
+from jarvis import Jarvis, Metrics
+
+# No log output from the assistants under test
+logging.disable(logging.CRITICAL)
+
+class MetricsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="jarvis-test-")
+        self.data_file = os.path.join(self.directory, "jarvis_data.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_data_file(self, **settings):
+        data = {
+            "ai": {"categories": ["AI"], "conversations": [{"user": "What is AI?", "bot": "Thinking machines."}]},
+            "data_file": self.data_file,
+            "settings_file": os.path.join(self.directory, "jarvis_settings.json"),
+            "voice_enabled": False,
+            "hot_reload": {"enabled": False},
+        }
+        data.update(settings)
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+class JarvisMetricsTest(MetricsTestCase):
+
+    def test_server_priming_is_not_counted(self):
+        self.write_data_file()
+        assistant = Jarvis.for_server(self.data_file)
+        try:
+            lines = assistant.metrics.render().splitlines()
+            self.assertIn("jarvis_requests_total 0", lines)
+            self.assertIn("jarvis_cache_misses_total 0", lines)
+            self.assertFalse([line for line in lines if line.startswith("jarvis_stage_seconds")])
+
+            self.assertEqual(assistant.match("what is ai?"), ("Thinking machines.", 1.0))
+            lines = assistant.metrics.render().splitlines()
+            self.assertIn("jarvis_requests_total 1", lines)
+            self.assertIn('jarvis_stage_seconds_count{stage="exact_match"} 1', lines)
+        finally:
+            assistant.stop_watching()
+
+class DisabledMetricsTest(MetricsTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # The test modules silence logging for the whole process
+        logging.disable(logging.NOTSET)
+        self.addCleanup(logging.disable, logging.CRITICAL)
+
+    def test_stage_timings_are_logged_at_debug_level(self):
+        metrics = Metrics(enabled=False)
+        with self.assertLogs(jarvis.logger, logging.DEBUG) as logs:
+            with metrics.time("web_search"):
+                pass
+            metrics.observe_stage("exact_match", 0.0015)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("Stage web_search took", logs.records[0].getMessage())
+        self.assertEqual(logs.records[1].getMessage(), "Stage exact_match took 1.5ms")
+        self.assertNotIn("jarvis_stage_seconds", metrics.render())
+
+    def test_stage_timings_reach_the_request_log_line(self):
+        self.write_data_file(
+            metrics={"enabled": False},
+            logging={"file": os.path.join(self.directory, "jarvis.log"), "log_requests": True},
+        )
+        assistant = Jarvis(self.data_file)
+        self.addCleanup(assistant.stop_watching)
+        with mock.patch.object(assistant, "_search_google", return_value="searched"):
+            with self.assertLogs(jarvis.logger, logging.INFO) as logs:
+                self.assertEqual(assistant.process_command("qwxz zzkv"), "searched")
+        finished = [record for record in logs.records if record.getMessage().startswith("Request finished")]
+        self.assertEqual(len(finished), 1)
+        self.assertEqual(set(finished[0].stages), {"similarity_match", "web_search"})
+
+if __name__ == "__main__":
+    unittest.main()
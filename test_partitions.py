@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Tests for per-language knowledge base partitions
+
+Usage:
+    python -m pytest -q test_partitions.py
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jarvis import Jarvis
+
+# No log output from the assistants under test
+logging.disable(logging.CRITICAL)
+
+LANGUAGES = {
+    "en": ("what is your name", "I am Jarvis."),
+    "hi": ("aapka naam kya hai", "Mera naam Jarvis hai."),
+    "fr": ("comment tu t'appelles", "Je m'appelle Jarvis."),
+}
+
+def write_language(path, language, answer=None, **settings):
+    prompt, bot = LANGUAGES[language]
+    data = {"general": {"categories": ["general"], "conversations": [{"user": prompt, "bot": answer or bot}]}}
+    data.update(settings)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+class PartitionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="jarvis-test-")
+        self.files = {language: os.path.join(self.directory, f"jarvis_data.{language}.json") for language in LANGUAGES}
+        for language in ("hi", "fr"):
+            write_language(self.files[language], language)
+        self.write_config()
+        self.assistants = []
+
+    def tearDown(self):
+        for assistant in self.assistants:
+            assistant.stop_watching()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_config(self, **partitions):
+        partitions.setdefault("files", {"hi": self.files["hi"], "fr": self.files["fr"], "de": self.path("missing.json")})
+        write_language(
+            self.files["en"], "en",
+            data_file=self.files["en"],
+            settings_file=self.path("jarvis_settings.json"),
+            voice_enabled=False,
+            hot_reload={"enabled": False},
+            partitions=partitions,
+        )
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def create(self):
+        assistant = Jarvis(self.files["en"])
+        self.assistants.append(assistant)
+        return assistant
+
+    def assertAnswers(self, assistant, language, answer=None):
+        prompt, bot = LANGUAGES[language]
+        self.assertEqual(assistant.match(prompt), (answer or bot, 1.0))
+        for other, (other_prompt, _) in LANGUAGES.items():
+            if other != language:
+                self.assertNotIn(other_prompt, assistant._exact_index)
+
+    def parked(self, assistant):
+        return {language for language, path in self.files.items()
+                if os.path.abspath(path) in assistant._partitions}
+
+    def test_selecting_a_language_switches_answers(self):
+        assistant = self.create()
+        self.assertAnswers(assistant, "en")
+        assistant.process_command(LANGUAGES["en"][0])
+        version = assistant.dataset_version
+
+        self.assertTrue(assistant.select_language("hi"))
+        self.assertGreater(assistant.dataset_version, version)
+        self.assertEqual(assistant.response_cache.stats()["size"], 0)
+        self.assertEqual(assistant.config["language"], "hi")
+        self.assertAnswers(assistant, "hi")
+
+    def test_languages_without_data_keep_the_active_one(self):
+        assistant = self.create()
+        # "es" has no data file, "de" maps to a file that does not exist
+        for language in ("es", "de"):
+            self.assertFalse(assistant.select_language(language), msg=language)
+            self.assertAnswers(assistant, "en")
+            self.assertEqual(assistant.config["language"], "en")
+
+    def test_switching_back_reuses_the_parked_tables(self):
+        assistant = self.create()
+        tables = assistant._exact_index
+        self.assertTrue(assistant.select_language("hi"))
+        self.assertEqual(self.parked(assistant), {"en"})
+        self.assertTrue(assistant.select_language("en"))
+        self.assertIs(assistant._exact_index, tables)
+        self.assertEqual(self.parked(assistant), {"hi"})
+        self.assertAnswers(assistant, "en")
+
+    def test_least_recently_used_languages_are_evicted_beyond_the_budget(self):
+        sizes = {language: os.path.getsize(path) for language, path in self.files.items()}
+        # Room for the two smaller parked partitions together, not all of them
+        self.write_config(memory_budget_mb=(sizes["en"] + sizes["hi"] - 1) / 2 ** 20)
+        assistant = self.create()
+        self.assertTrue(assistant.select_language("hi"))
+        self.assertTrue(assistant.select_language("fr"))
+        self.assertEqual(self.parked(assistant), {"hi"})
+
+        # Evicted languages are loaded from disk again; the config makes
+        # the default language's file the largest, so the others both fit
+        self.assertTrue(assistant.select_language("en"))
+        self.assertAnswers(assistant, "en")
+        self.assertEqual(self.parked(assistant), {"hi", "fr"})
+
+    def test_parked_language_edited_on_disk_is_reloaded(self):
+        assistant = self.create()
+        self.assertTrue(assistant.select_language("hi"))
+        self.assertTrue(assistant.select_language("en"))
+        write_language(self.files["hi"], "hi", answer="Mera naam ab bhi Jarvis hai.")
+        self.assertTrue(assistant.select_language("hi"))
+        self.assertAnswers(assistant, "hi", answer="Mera naam ab bhi Jarvis hai.")
+
+if __name__ == "__main__":
+    unittest.main()
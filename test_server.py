@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Tests for the HTTP server's query API and static file handling
+
+Usage:
+    python -m pytest -q test_server.py
+"""
+import functools
+import gzip
+import http.client
+import http.server
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import server
+from jarvis import Jarvis
+
+# No log output from the assistant under test
+logging.disable(logging.CRITICAL)
+
+TIMEOUT = 5
+
+class QuietHandler(server.MyHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+class ServerTestCase(unittest.TestCase):
+    """Serves a temporary directory with a small assistant behind /api/query"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp(prefix="jarvis-test-")
+        cls.data_file = os.path.join(cls.directory, "jarvis_data.json")
+        with open(cls.data_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "ai": {"categories": ["AI"], "conversations": [{"user": "What is AI?", "bot": "Thinking machines."}]},
+                "data_file": cls.data_file,
+                "settings_file": os.path.join(cls.directory, "jarvis_settings.json"),
+                "voice_enabled": False,
+                "hot_reload": {"enabled": False},
+            }, f)
+        server.assistant = Jarvis.for_server(cls.data_file)
+        handler = functools.partial(QuietHandler, directory=cls.directory)
+        cls.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        server.assistant.stop_watching()
+        server.assistant = None
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def request(self, method, path, body=None, headers=None):
+        """(response, body) of one request on a fresh connection"""
+        connection = http.client.HTTPConnection("127.0.0.1", self.httpd.server_address[1], timeout=TIMEOUT)
+        try:
+            connection.request(method, path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response, response.read()
+        finally:
+            connection.close()
+
+class QueryTest(ServerTestCase):
+
+    def test_post_and_get_answer_from_the_dataset(self):
+        for method, path, body in (
+            ("POST", "/api/query", json.dumps({"query": "what is ai?"})),
+            ("GET", "/api/query?q=what+is+ai%3F", None),
+        ):
+            response, content = self.request(method, path, body)
+            self.assertEqual(response.status, 200, msg=method)
+            self.assertEqual(json.loads(content)["response"], "Thinking machines.", msg=method)
+
+    def test_rejects_bad_requests(self):
+        for body, headers, status in (
+            ("{not json", {}, 400),
+            (json.dumps({"query": "  "}), {}, 400),
+            ("x" * (server.MAX_QUERY_BYTES + 1), {}, 413),
+            (None, {"Content-Length": "-1"}, 400),
+            (None, {"Content-Length": "many"}, 400),
+        ):
+            response, _ = self.request("POST", "/api/query", body, headers)
+            self.assertEqual(response.status, status, msg=headers or body[:20])
+
+    def test_unknown_post_path(self):
+        response, _ = self.request("POST", "/api/other", "{}")
+        self.assertEqual(response.status, 404)
+
+class AssetTest(ServerTestCase):
+    """index.html is served from the asset cache, notes.txt from disk"""
+
+    CONTENT = b"<p>Hello, I am Jarvis.</p>\n" * 200
+    PATHS = ("/index.html", "/notes.txt")
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in ("index.html", "notes.txt"):
+            with open(os.path.join(cls.directory, name), 'wb') as f:
+                f.write(cls.CONTENT)
+        # Written after the file, as build_client.py does
+        with open(os.path.join(cls.directory, "notes.txt.gz"), 'wb') as f:
+            f.write(gzip.compress(cls.CONTENT))
+
+    def test_sends_compressed_content_to_clients_that_accept_it(self):
+        for path in self.PATHS:
+            response, body = self.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.status, 200, msg=path)
+            self.assertEqual(response.getheader("Content-Encoding"), "gzip", msg=path)
+            self.assertEqual(gzip.decompress(body), self.CONTENT, msg=path)
+
+            response, body = self.request("GET", path)
+            self.assertIsNone(response.getheader("Content-Encoding"), msg=path)
+            self.assertEqual(body, self.CONTENT, msg=path)
+
+    def test_matching_etag_is_not_modified(self):
+        for path in self.PATHS:
+            for encoding in ("gzip", "identity"):
+                response, _ = self.request("GET", path, headers={"Accept-Encoding": encoding})
+                etag = response.getheader("ETag")
+                self.assertTrue(response.getheader("Last-Modified"), msg=path)
+
+                response, body = self.request("GET", path, headers={"Accept-Encoding": encoding, "If-None-Match": etag})
+                self.assertEqual((response.status, body), (304, b""), msg=(path, encoding))
+                self.assertEqual(response.getheader("ETag"), etag, msg=(path, encoding))
+
+                response, _ = self.request("GET", path, headers={"If-None-Match": '"other"'})
+                self.assertEqual(response.status, 200, msg=(path, encoding))
+
+    def test_byte_ranges(self):
+        size = len(self.CONTENT)
+        for path in self.PATHS:
+            for header, expected, content_range in (
+                ("bytes=10-19", self.CONTENT[10:20], f"bytes 10-19/{size}"),
+                ("bytes=-5", self.CONTENT[-5:], f"bytes {size - 5}-{size - 1}/{size}"),
+                (f"bytes={size - 3}-", self.CONTENT[-3:], f"bytes {size - 3}-{size - 1}/{size}"),
+            ):
+                response, body = self.request("GET", path, headers={"Range": header})
+                self.assertEqual((response.status, body), (206, expected), msg=(path, header))
+                self.assertEqual(response.getheader("Content-Range"), content_range, msg=(path, header))
+
+            response, _ = self.request("GET", path, headers={"Range": f"bytes={size}-"})
+            self.assertEqual(response.status, 416, msg=path)
+            self.assertEqual(response.getheader("Content-Range"), f"bytes */{size}", msg=path)
+
+    def test_head_sends_headers_only(self):
+        for path in self.PATHS:
+            response, body = self.request("HEAD", path)
+            self.assertEqual((response.status, body), (200, b""), msg=path)
+            self.assertEqual(response.getheader("Content-Length"), str(len(self.CONTENT)), msg=path)
+
+    def test_stale_compressed_copy_is_ignored(self):
+        path = os.path.join(self.directory, "stale.txt")
+        with open(path + ".gz", 'wb') as f:
+            f.write(gzip.compress(b"previous version"))
+        with open(path, 'wb') as f:
+            f.write(self.CONTENT)
+        modified = os.stat(path).st_mtime_ns
+        os.utime(path + ".gz", ns=(modified - 10 ** 9, modified - 10 ** 9))
+
+        response, body = self.request("GET", "/stale.txt", headers={"Accept-Encoding": "gzip"})
+        self.assertIsNone(response.getheader("Content-Encoding"))
+        self.assertEqual(body, self.CONTENT)
+
+    def test_large_client_index_is_streamed_precompressed(self):
+        from build_client import build
+        manifest = build(self.data_file, os.path.join(self.directory, server.CLIENT_DIR))
+        path = f"/{server.CLIENT_DIR}/{manifest['index']}"
+        with open(os.path.join(self.directory, server.CLIENT_DIR, manifest["index"]), 'rb') as f:
+            content = f.read()
+
+        # Too large for the asset cache, as a production-size index is
+        with mock.patch.object(server, "MAX_CACHED_ASSET_BYTES", 0):
+            response, body = self.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            self.assertEqual(response.getheader("Content-Encoding"), "gzip")
+            self.assertEqual(response.getheader("Cache-Control"), server.IMMUTABLE_CACHE_POLICY)
+            self.assertEqual(gzip.decompress(body), content)
+
+            response, body = self.request("GET", path, headers={"Accept-Encoding": "gzip", "If-None-Match": response.getheader("ETag")})
+            self.assertEqual(response.status, 304)
+
+    def test_missing_file(self):
+        response, _ = self.request("GET", "/missing.txt")
+        self.assertEqual(response.status, 404)
+
+class ClientIndexTest(ServerTestCase):
+
+    def setUp(self):
+        # build_client_index writes CLIENT_DIR relative to the working directory
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.directory)
+        self.addCleanup(setattr, server, "client_index_version", None)
+
+    def fetch_index(self):
+        """(index name, index document) as the web UI loads them"""
+        response, body = self.request("GET", server.CLIENT_MANIFEST_PATH)
+        self.assertEqual(response.status, 200)
+        name = json.loads(body)["index"]
+        response, body = self.request("GET", f"/{server.CLIENT_DIR}/{name}")
+        self.assertEqual(response.status, 200)
+        return name, json.loads(body)
+
+    def write_conversations(self, conversations):
+        with open(self.data_file, encoding='utf-8') as f:
+            data = json.load(f)
+        data["ai"]["conversations"] = conversations
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+    def test_index_is_rebuilt_after_a_reload(self):
+        server.build_client_index()
+        name, index = self.fetch_index()
+        self.assertEqual(index["strings"], ["Thinking machines."])
+
+        conversations = [
+            {"user": "What is AI?", "bot": "Thinking machines."},
+            {"user": "Tell me a joke", "bot": "Why did the robot cross the road?"},
+        ]
+        self.write_conversations(conversations)
+        # Not served before the assistant has loaded it
+        self.assertEqual(self.fetch_index()[0], name)
+
+        self.assertTrue(server.assistant.reload_dataset())
+        reloaded_name, index = self.fetch_index()
+        self.assertNotEqual(reloaded_name, name)
+        self.assertIn("tell me a joke", index["prompts"])
+        self.assertEqual(self.fetch_index()[0], reloaded_name)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Tests for the runtime settings file
+
+Usage:
+    python -m pytest -q test_settings.py
+"""
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jarvis import Jarvis, SettingsStore
+
+# No log output from the assistants under test
+logging.disable(logging.CRITICAL)
+
+class SettingsStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="jarvis-test-")
+        self.path = os.path.join(self.directory, "jarvis_settings.json")
+        self.store = SettingsStore(self.path, delay=0.05)
+
+    def tearDown(self):
+        self.store.flush()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def wait_for_write(self):
+        timer = self.store._timer
+        if timer is not None:
+            timer.join(5)
+
+    def test_saves_within_the_delay_are_coalesced(self):
+        with mock.patch("jarvis.os.replace", wraps=os.replace) as replace:
+            self.store.save({"voice_rate": 100})
+            self.store.save({"voice_rate": 150, "language": "en"})
+            self.store.save({"voice_rate": 200})
+            self.assertFalse(os.path.exists(self.path))
+            self.wait_for_write()
+        self.assertEqual(replace.call_count, 1)
+        self.assertEqual(self.read(), {"voice_rate": 200})
+
+    def test_saves_after_a_write_schedule_another(self):
+        self.store.save({"voice_rate": 100})
+        self.wait_for_write()
+        self.store.save({"voice_rate": 200})
+        self.wait_for_write()
+        self.assertEqual(self.read(), {"voice_rate": 200})
+
+    def test_flush_writes_immediately(self):
+        self.store.save({"voice_rate": 100})
+        self.store.flush()
+        self.assertEqual(self.read(), {"voice_rate": 100})
+        self.assertIsNone(self.store._timer)
+
+    def test_flush_without_pending_settings_does_not_write(self):
+        with mock.patch("jarvis.os.replace") as replace:
+            self.store.flush()
+        replace.assert_not_called()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_failed_write_keeps_the_previous_file(self):
+        self.store.save({"voice_rate": 100})
+        self.store.flush()
+        # Not JSON serializable: the write fails halfway through
+        self.store.save({"voice_rate": object()})
+        self.store.flush()
+        self.assertEqual(self.read(), {"voice_rate": 100})
+
+    def test_written_through_a_temporary_file(self):
+        self.store.save({"voice_rate": 100})
+        self.store.flush()
+        self.assertEqual(os.listdir(self.directory), ["jarvis_settings.json"])
+
+    def test_load_tolerates_missing_and_broken_files(self):
+        self.assertEqual(self.store.load(), {})
+        for content in ("{not json", "[1, 2]"):
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            self.assertEqual(self.store.load(), {}, msg=content)
+
+class JarvisSettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="jarvis-test-")
+        self.data_file = os.path.join(self.directory, "jarvis_data.json")
+        self.settings_file = os.path.join(self.directory, "jarvis_settings.json")
+        with open(self.data_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "ai": {"categories": ["AI"], "conversations": [{"user": "What is AI?", "bot": "Thinking machines."}]},
+                "data_file": self.data_file,
+                "settings_file": self.settings_file,
+                "voice_enabled": False,
+                "voice_rate": 150,
+                "hot_reload": {"enabled": False},
+            }, f)
+        self.assistants = []
+
+    def tearDown(self):
+        for assistant in self.assistants:
+            assistant.stop_watching()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def create(self):
+        assistant = Jarvis(self.data_file)
+        self.assistants.append(assistant)
+        return assistant
+
+    def test_saved_settings_override_the_config_file(self):
+        with open(self.data_file, 'rb') as f:
+            data = f.read()
+        assistant = self.create()
+        assistant.config["voice_rate"] = 210
+        assistant._save_config()
+        assistant.settings_store.flush()
+
+        self.assertEqual(self.create().config["voice_rate"], 210)
+        with open(self.settings_file, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["voice_rate"], 210)
+        # The data file is never rewritten
+        with open(self.data_file, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    def test_only_runtime_settings_are_persisted_or_applied(self):
+        with open(self.settings_file, 'w', encoding='utf-8') as f:
+            json.dump({"voice_rate": 90, "data_file": "elsewhere.json"}, f)
+        assistant = self.create()
+        self.assertEqual(assistant.config["voice_rate"], 90)
+        self.assertEqual(assistant.config["data_file"], self.data_file)
+
+        assistant._save_config()
+        assistant.settings_store.flush()
+        with open(self.settings_file, encoding='utf-8') as f:
+            self.assertNotIn("data_file", json.load(f))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Tests for the prioritized speech queue
+
+Usage:
+    python -m pytest -q test_speech.py
+"""
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jarvis import SpeechQueue
+
+# No log output from the queue under test
+logging.disable(logging.CRITICAL)
+
+TIMEOUT = 5
+
+class FakeEngine:
+    """Stands in for pyttsx3: speaks word by word and can be held in place
+
+    While `hold` is set playback waits before the next word. Every
+    utterance ends up in `log` as (text, completed).
+    """
+
+    def __init__(self):
+        self.hold = threading.Event()
+        self.started = threading.Event()
+        self.log = []
+        self.stop_threads = []
+        self._callbacks = {}
+        self._text = None
+        self._stopped = False
+
+    def connect(self, topic, callback):
+        self._callbacks.setdefault(topic, []).append(callback)
+        return callback
+
+    def say(self, text):
+        self._text = text
+
+    def runAndWait(self):
+        text, self._text = self._text, None
+        self.started.set()
+        location = 0
+        for word in text.split():
+            while self.hold.is_set() and not self._stopped:
+                time.sleep(0.005)
+            if self._stopped:
+                break
+            for callback in self._callbacks.get('started-word', []):
+                callback(text, location, len(word))
+            if self._stopped:
+                break
+            location += len(word) + 1
+        self.log.append((text, not self._stopped))
+        self._stopped = False
+
+    def stop(self):
+        self.stop_threads.append(threading.current_thread())
+        self._stopped = True
+
+class SpeechQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = FakeEngine()
+        self.queue = SpeechQueue(lambda: self.engine, max_size=4)
+        self.assertIs(self.queue.start(), self.engine)
+
+    def tearDown(self):
+        self.engine.hold.clear()
+        self.queue.shutdown(wait=False)
+
+    def start_speaking(self, text, priority):
+        """Submit text and wait until the held engine is playing it"""
+        self.engine.hold.set()
+        future = self.queue.submit(text, priority)
+        self.assertTrue(self.engine.started.wait(TIMEOUT))
+        return future
+
+    def test_equal_priority_is_spoken_in_order(self):
+        futures = [self.start_speaking("first", 2)]
+        futures += [self.queue.submit(text, priority) for text, priority in
+                    (("second", 2), ("third", 2), ("last", 3))]
+        self.engine.hold.clear()
+        self.assertEqual([future.result(TIMEOUT) for future in futures], [True] * 4)
+        self.assertEqual(self.engine.log, [
+            ("first", True), ("second", True), ("third", True), ("last", True)
+        ])
+
+    def test_urgent_speech_interrupts_and_cancels_less_important(self):
+        story = self.start_speaking("a long story about robots", 3)
+        queued = self.queue.submit("another story", 3)
+        urgent = self.queue.submit("alert", 1)
+        self.engine.hold.clear()
+
+        self.assertTrue(urgent.result(TIMEOUT))
+        self.assertFalse(story.result(TIMEOUT))
+        self.assertTrue(queued.cancelled())
+        self.assertEqual(self.engine.log, [("a long story about robots", False), ("alert", True)])
+
+    def test_same_text_is_coalesced(self):
+        self.start_speaking("first", 1)
+        hello = self.queue.submit("hello", 2)
+        self.assertIs(self.queue.submit("hello", 2), hello)
+        # Already waiting at a higher priority
+        self.assertIs(self.queue.submit("hello", 3), hello)
+        self.engine.hold.clear()
+        self.assertTrue(hello.result(TIMEOUT))
+        self.assertEqual([text for text, _ in self.engine.log], ["first", "hello"])
+
+    def test_full_queue_drops_the_oldest_least_important(self):
+        self.start_speaking("current", 1)
+        futures = [self.queue.submit(text, 2) for text in ("a", "b", "c", "d", "e")]
+        self.assertTrue(futures[0].cancelled())
+        # Less important than everything queued: dropped itself
+        self.assertTrue(self.queue.submit("f", 3).cancelled())
+        self.engine.hold.clear()
+        self.assertEqual([future.result(TIMEOUT) for future in futures[1:]], [True] * 4)
+        self.assertEqual([text for text, _ in self.engine.log], ["current", "b", "c", "d", "e"])
+
+    def test_shutdown_finishes_queued_speech(self):
+        futures = [self.start_speaking("goodbye", 1), self.queue.submit("see you", 1)]
+        self.engine.hold.clear()
+        self.queue.shutdown(timeout=TIMEOUT)
+        self.assertEqual([future.result(0) for future in futures], [True, True])
+        self.assertTrue(self.queue.submit("too late", 1).cancelled())
+
+    def test_shutdown_without_wait_stops_speech(self):
+        current = self.start_speaking("goodbye", 1)
+        queued = self.queue.submit("see you", 1)
+        self.queue.shutdown(wait=False)
+        self.engine.hold.clear()
+        self.assertFalse(current.result(TIMEOUT))
+        self.assertTrue(queued.cancelled())
+
+    def test_engine_is_only_stopped_from_the_worker(self):
+        story = self.start_speaking("a long story about robots", 3)
+        self.queue.submit("alert", 1)
+        # Interrupting only raises a flag for the worker
+        self.assertEqual(self.engine.stop_threads, [])
+        self.engine.hold.clear()
+        self.assertFalse(story.result(TIMEOUT))
+        self.assertTrue(self.engine.stop_threads)
+        self.assertTrue(all(thread is self.queue._thread for thread in self.engine.stop_threads))
+
+    def test_engine_errors_are_raised_by_start(self):
+        def broken():
+            raise RuntimeError("no audio device")
+        with self.assertRaisesRegex(RuntimeError, "no audio device"):
+            SpeechQueue(broken).start()
+
+if __name__ == "__main__":
+    unittest.main()